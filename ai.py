@@ -1,24 +1,249 @@
 import os
 import json
-import requests
-import pytesseract
-import streamlit as st
+import time
+import random
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from cache import DATA_DIR, DiskCache, make_key
 
 FOLDER_ID = "b1gmqadknbamelp5jqj4"
 
 YANDEX_MODEL_LITE = "yandexgpt-lite"
 YANDEX_MODEL_CHAT = "yandexgpt"
 
-YANDEX_COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+# Можно направить на локальную заглушку (mock_yandex.py) для офлайн-тестов.
+YANDEX_COMPLETION_URL = os.getenv(
+    "YANDEX_COMPLETION_URL",
+    "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+)
 
+YANDEX_POOL_SIZE = int(os.getenv("YANDEX_POOL_SIZE", "16"))
+YANDEX_TIMEOUT = 60
+
+# Клиентское ограничение частоты запросов и повторы при перегрузке API.
+YANDEX_RPS = float(os.getenv("YANDEX_RPS", "8"))
+YANDEX_BURST = int(os.getenv("YANDEX_BURST", "8"))
+YANDEX_MAX_RETRIES = int(os.getenv("YANDEX_MAX_RETRIES", "5"))
+YANDEX_BACKOFF_BASE = 1.0
+YANDEX_BACKOFF_MAX = 30.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Сколько запросов к модели одновременно выполняют пакетные хелперы.
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+
+# Сколько дисциплин обогащается одним запросом в enrich_disciplines_batch.
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "10"))
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Кэш ответов модели. При температуре до 0.1 (разбор команд, обогащение,
+# определение профиля) ответы практически детерминированы, поэтому повторные
+# запуски конвейера берутся из кэша. Генерация РПД и сопоставление (0.2–0.25)
+# не кэшируются, чтобы повторный запуск давал новый вариант.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.1"))
+
+_ttl = os.getenv("LLM_CACHE_TTL")
+
+completion_cache = DiskCache(
+    os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3")),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    ttl=float(_ttl) if _ttl else None
+)
+
+
+class TokenBucket:
+    """
+    Потокобезопасный лимитер «token bucket»: в среднем rate запросов
+    в секунду, допускаются всплески до capacity запросов.
+    Один экземпляр на процесс, поэтому лимит общий для всех потоков
+    и всех сессий Streamlit.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+rate_limiter = TokenBucket(YANDEX_RPS, YANDEX_BURST)
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
 
-def get_yandex_api_key() -> str:
     try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _can_wait(delay: float) -> bool:
+    time_left = _time_left()
+    return time_left is None or delay < time_left
+
+
+def _backoff_delay(attempt: int) -> float:
+    delay = min(YANDEX_BACKOFF_MAX, YANDEX_BACKOFF_BASE * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Срок (time.monotonic()), до которого должен завершиться текущий вызов модели.
+# Устанавливается gather_bounded при timeout, чтобы брошенный по таймауту
+# поток не продолжал повторять запросы в фоне.
+request_deadline = contextvars.ContextVar("yandex_request_deadline", default=None)
+
+
+def _time_left():
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def send_completion_request(data: dict, stream: bool = False):
+    """
+    Отправляет запрос к completion API через лимитер.
+    При 429/5xx, таймауте или обрыве соединения повторяет запрос
+    с экспоненциальной задержкой и джиттером (учитывая Retry-After).
+    Если задан request_deadline, таймаут запроса и повторы ограничены им.
+    Возвращает успешный response; после исчерпания попыток — RuntimeError.
+    """
+    for attempt in range(YANDEX_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        last_attempt = attempt == YANDEX_MAX_RETRIES
+
+        time_left = _time_left()
+        if time_left is not None and time_left <= 0:
+            raise RuntimeError("Yandex API: истёк срок ожидания ответа")
+
+        try:
+            response = get_http_session().post(
+                YANDEX_COMPLETION_URL,
+                headers=get_yandex_headers(),
+                json=data,
+                timeout=YANDEX_TIMEOUT if time_left is None else min(YANDEX_TIMEOUT, time_left),
+                stream=stream
+            )
+        except (_requests().Timeout, _requests().ConnectionError) as e:
+            delay = _backoff_delay(attempt)
+            if last_attempt or not _can_wait(delay):
+                raise RuntimeError(f"Yandex API недоступен: {e}") from e
+            time.sleep(delay)
+            continue
+
+        if response.ok:
+            return response
+
+        if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+            delay = _retry_after_seconds(response)
+            if delay is None:
+                delay = _backoff_delay(attempt)
+            delay = min(delay, YANDEX_BACKOFF_MAX)
+            if _can_wait(delay):
+                response.close()
+                time.sleep(delay)
+                continue
+
+        raise RuntimeError(
+            f"Yandex API вернул {response.status_code}: {response.text}"
+        )
+
+
+def _api_key_from_env():
+    return os.getenv("YANDEX_API_KEY")
+
+
+def _api_key_from_file():
+    path = os.getenv("YANDEX_API_KEY_FILE")
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def _api_key_from_streamlit_secrets():
+    try:
+        import streamlit as st
         return st.secrets["YANDEX_API_KEY"]
-    except Exception as e:
+    except Exception:
+        return None
+
+
+# Источники ключа в порядке приоритета. Ключ ищется один раз на процесс,
+# поэтому CLI и рабочие процессы обходятся без импорта streamlit.
+CREDENTIAL_PROVIDERS = [
+    _api_key_from_env,
+    _api_key_from_file,
+    _api_key_from_streamlit_secrets,
+]
+
+_api_key = None
+_api_key_lock = threading.Lock()
+
+
+def get_yandex_api_key() -> str:
+    global _api_key
+
+    if _api_key is None:
+        with _api_key_lock:
+            if _api_key is None:
+                for provider in CREDENTIAL_PROVIDERS:
+                    key = provider()
+                    if key:
+                        _api_key = key
+                        break
+
+    if _api_key is None:
         raise RuntimeError(
-            "Не найден YANDEX_API_KEY. Добавь ключ в .streamlit/secrets.toml"
-        ) from e
+            "Не найден YANDEX_API_KEY. Задай переменную окружения YANDEX_API_KEY, "
+            "файл YANDEX_API_KEY_FILE или ключ в .streamlit/secrets.toml"
+        )
+
+    return _api_key
+
+
+def reset_credentials() -> None:
+    """
+    Сбрасывает закэшированный ключ (например, после смены секретов).
+    """
+    global _api_key
+
+    with _api_key_lock:
+        _api_key = None
 
 
 def get_yandex_headers() -> dict:
@@ -28,35 +253,327 @@ def get_yandex_headers() -> dict:
     }
 
 
-def post_to_yandex(messages, model_name: str, temperature: float, max_tokens: int) -> dict:
-    data = {
+def _requests():
+    import requests
+    return requests
+
+
+def get_http_session():
+    """
+    Общая для всех вызовов сессия с пулом keep-alive соединений.
+    Создаётся один раз на процесс; пул urllib3 потокобезопасен,
+    поэтому сессию можно использовать из рабочих потоков.
+    """
+    global _http_session
+
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                requests = _requests()
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=YANDEX_POOL_SIZE,
+                    pool_maxsize=YANDEX_POOL_SIZE,
+                    pool_block=True
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                _http_session = session
+
+    return _http_session
+
+
+def build_completion_request(messages, model_name: str, temperature: float, max_tokens: int,
+                             stream: bool = False) -> dict:
+    return {
         "modelUri": f"gpt://{FOLDER_ID}/{model_name}",
         "completionOptions": {
-            "stream": False,
+            "stream": stream,
             "temperature": temperature,
             "maxTokens": str(max_tokens)
         },
         "messages": messages
     }
 
-    response = requests.post(
-        YANDEX_COMPLETION_URL,
-        headers=get_yandex_headers(),
-        json=data,
-        timeout=60
+
+def _prometheus_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LLMMetrics:
+    """
+    Реестр метрик вызовов модели: по каждому вызову хранится вызывающая
+    стадия, модель, размер промпта и ответа, расход токенов по данным API,
+    время и исход (ok / cache_hit / error).
+
+    Сводка по стадиям накапливается с момента запуска (или reset) и только
+    растёт, как положено счётчикам Prometheus; для JSON-снимка дополнительно
+    хранятся последние max_records отдельных вызовов.
+    """
+
+    SUMMED_FIELDS = ("prompt_chars", "response_chars", "input_tokens",
+                     "completion_tokens", "total_tokens")
+
+    def __init__(self, max_records: int = 10000):
+        self._records = deque(maxlen=max_records)
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def record(self, caller: str, model: str, messages, response: dict = None,
+               response_text: str = "", wall_time: float = 0.0, outcome: str = "ok") -> None:
+        usage = ((response or {}).get("result") or {}).get("usage") or {}
+        if outcome == "cache_hit":
+            # Ответ из кэша не тарифицируется: его usage относится к исходному вызову.
+            usage = {}
+
+        if not response_text and response:
+            try:
+                response_text = response["result"]["alternatives"][0]["message"]["text"]
+            except (KeyError, IndexError, TypeError):
+                response_text = ""
+
+        entry = {
+            "ts": time.time(),
+            "caller": caller or "unknown",
+            "model": model,
+            "prompt_chars": sum(len(str(m.get("text", ""))) for m in messages or []),
+            "response_chars": len(response_text or ""),
+            "input_tokens": int(usage.get("inputTextTokens") or 0),
+            "completion_tokens": int(usage.get("completionTokens") or 0),
+            "total_tokens": int(usage.get("totalTokens") or 0),
+            "wall_time": round(wall_time, 4),
+            "outcome": outcome,
+        }
+
+        with self._lock:
+            self._records.append(entry)
+            self._accumulate(entry)
+
+    def _accumulate(self, r: dict) -> None:
+        g = self._groups.get((r["caller"], r["model"]))
+        if g is None:
+            g = self._groups[(r["caller"], r["model"])] = {
+                "caller": r["caller"],
+                "model": r["model"],
+                "calls": 0,
+                "errors": 0,
+                "cache_hits": 0,
+                "wall_time": 0.0,
+                "max_wall_time": 0.0,
+                **{field: 0 for field in self.SUMMED_FIELDS},
+            }
+
+        g["calls"] += 1
+        g["errors"] += r["outcome"] == "error"
+        g["cache_hits"] += r["outcome"] == "cache_hit"
+        g["wall_time"] += r["wall_time"]
+        g["max_wall_time"] = max(g["max_wall_time"], r["wall_time"])
+
+        for field in self.SUMMED_FIELDS:
+            g[field] += r[field]
+
+    def records(self) -> list:
+        with self._lock:
+            return list(self._records)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._groups.clear()
+
+    def summary(self) -> dict:
+        """
+        Накопленные агрегаты по паре (caller, model).
+        """
+        with self._lock:
+            stages = [dict(g, wall_time=round(g["wall_time"], 4)) for g in self._groups.values()]
+
+        return {
+            "stages": sorted(stages, key=lambda g: g["wall_time"], reverse=True),
+            "cache": completion_cache.stats(),
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "generated_at": time.time(),
+            **self.summary(),
+            "records": self.records(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        summary = self.summary()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            # Сэмпл — (labels, value) или (labels, value, suffix) для _sum/_count.
+            for labels, value, *suffix in samples:
+                label_text = ",".join(
+                    f'{k}="{_prometheus_escape(v)}"' for k, v in labels.items()
+                )
+                lines.append(f"{name}{''.join(suffix)}{{{label_text}}} {value}")
+
+        stages = summary["stages"]
+
+        def labels(g, **extra):
+            return {"caller": g["caller"], "model": g["model"], **extra}
+
+        metric("llm_calls_total", "counter", "LLM completion calls.", [
+            (labels(g, outcome=outcome), count)
+            for g in stages
+            for outcome, count in (
+                ("ok", g["calls"] - g["errors"] - g["cache_hits"]),
+                ("cache_hit", g["cache_hits"]),
+                ("error", g["errors"]),
+            )
+        ])
+        metric("llm_wall_seconds", "summary", "Wall time of LLM calls.", [
+            sample
+            for g in stages
+            for sample in (
+                (labels(g), round(g["wall_time"], 4), "_sum"),
+                (labels(g), g["calls"], "_count"),
+            )
+        ])
+        metric("llm_tokens_total", "counter", "Tokens reported by the API.", [
+            (labels(g, kind=kind), g[f"{kind}_tokens"])
+            for g in stages
+            for kind in ("input", "completion")
+        ])
+        metric("llm_prompt_chars_total", "counter", "Prompt size in characters.", [
+            (labels(g), g["prompt_chars"]) for g in stages
+        ])
+
+        cache = summary["cache"]
+        metric("llm_cache_hits_total", "counter", "Completion cache hits.", [({}, cache["hits"])])
+        metric("llm_cache_misses_total", "counter", "Completion cache misses.", [({}, cache["misses"])])
+        metric("llm_cache_bytes", "gauge", "Completion cache size.", [({}, cache["bytes"])])
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path: str = None, prometheus_path: str = None) -> None:
+        """
+        Сохраняет снимок метрик в JSON и/или текстовый формат Prometheus.
+        """
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write(self.to_json())
+
+        if prometheus_path:
+            with open(prometheus_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+
+llm_metrics = LLMMetrics()
+
+
+def _answer_text(result: dict) -> str:
+    try:
+        return result["result"]["alternatives"][0]["message"]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def post_to_yandex(messages, model_name: str, temperature: float, max_tokens: int,
+                   use_cache: bool = True, caller: str = "unknown", validate=None,
+                   refresh: bool = False) -> dict:
+    """
+    Запрос к модели с кэшем ответов.
+
+    validate(text) -> bool — проверка ответа вызывающим кодом: непригодный
+    ответ не кладётся в кэш, а найденный в кэше удаляется и запрашивается
+    заново. refresh=True не читает кэш, но сохраняет новый ответ.
+    """
+    data = build_completion_request(messages, model_name, temperature, max_tokens)
+    started = time.perf_counter()
+
+    cacheable = (
+        use_cache
+        and LLM_CACHE_ENABLED
+        and temperature <= LLM_CACHE_MAX_TEMPERATURE
     )
 
-    if not response.ok:
-        raise RuntimeError(
-            f"Yandex API вернул {response.status_code}: {response.text}"
+    if cacheable:
+        cache_key = make_key(
+            YANDEX_COMPLETION_URL, data["modelUri"], messages, temperature, str(max_tokens)
         )
+        cached = None if refresh else completion_cache.get(cache_key)
+        if cached is not None:
+            result = json.loads(cached)
+            if validate is None or validate(_answer_text(result)):
+                llm_metrics.record(caller, model_name, messages, result,
+                                   wall_time=time.perf_counter() - started, outcome="cache_hit")
+                return result
+            completion_cache.delete(cache_key)
 
-    return response.json()
+    try:
+        response = send_completion_request(data)
+        result = response.json()
+    except Exception:
+        llm_metrics.record(caller, model_name, messages,
+                           wall_time=time.perf_counter() - started, outcome="error")
+        raise
 
+    llm_metrics.record(caller, model_name, messages, result,
+                       wall_time=time.perf_counter() - started)
+
+    if cacheable and (validate is None or validate(_answer_text(result))):
+        completion_cache.set(cache_key, json.dumps(result, ensure_ascii=False))
+
+    return result
+
+
+def stream_from_yandex(messages, model_name: str, temperature: float, max_tokens: int,
+                       caller: str = "unknown"):
+    """
+    Потоковый запрос (stream=True): генератор отдаёт новые фрагменты текста
+    по мере того, как их присылает API.
+    Yandex присылает построчно JSON с накопленным текстом, поэтому
+    наружу отдаётся только приращение относительно уже выданного.
+    """
+    data = build_completion_request(messages, model_name, temperature, max_tokens, stream=True)
+    started = time.perf_counter()
+    emitted = ""
+    last_chunk = None
+    outcome = "error"
+
+    try:
+        with send_completion_request(data, stream=True) as response:
+            response.encoding = "utf-8"
 
-tesseract_path = os.getenv("TESSERACT_CMD")
-if tesseract_path:
-    pytesseract.pytesseract.tesseract_cmd = tesseract_path
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+
+                chunk = json.loads(line)
+                alternatives = chunk.get("result", {}).get("alternatives", [])
+                if not alternatives:
+                    continue
+
+                last_chunk = chunk
+                text = alternatives[0].get("message", {}).get("text", "")
+
+                if text.startswith(emitted):
+                    delta = text[len(emitted):]
+                else:
+                    delta = text
+
+                if delta:
+                    emitted += delta
+                    yield delta
+
+        outcome = "ok"
+
+    finally:
+        llm_metrics.record(caller, model_name, messages, last_chunk, emitted,
+                           wall_time=time.perf_counter() - started, outcome=outcome)
 
 
 def extract_json(text: str):
@@ -71,17 +588,144 @@ def extract_json(text: str):
         }
 
 
-def call_yandex_lite(messages, temperature=0.3, max_tokens=1500):
+def is_json_answer(text: str) -> bool:
+    """
+    Проверка для validate: в ответе есть разбираемый JSON-объект.
+    """
+    try:
+        start = text.index("{")
+        end = text.rindex("}") + 1
+        return isinstance(json.loads(text[start:end]), dict)
+    except Exception:
+        return False
+
+
+def call_yandex_lite(messages, temperature=0.3, max_tokens=1500, use_cache=True, caller="unknown",
+                     validate=None, refresh=False):
     result = post_to_yandex(
         messages=messages,
         model_name=YANDEX_MODEL_LITE,
         temperature=temperature,
-        max_tokens=max_tokens
+        max_tokens=max_tokens,
+        use_cache=use_cache,
+        caller=caller,
+        validate=validate,
+        refresh=refresh
     )
 
     return result["result"]["alternatives"][0]["message"]["text"]
 
 
+async def async_post_to_yandex(messages, model_name: str, temperature: float, max_tokens: int,
+                               use_cache: bool = True, caller: str = "unknown") -> dict:
+    """
+    Асинхронный вариант post_to_yandex: блокирующий запрос выполняется
+    в пуле потоков и использует общую keep-alive сессию.
+    """
+    return await asyncio.to_thread(
+        post_to_yandex, messages, model_name, temperature, max_tokens, use_cache, caller
+    )
+
+
+async def async_call_yandex_lite(messages, temperature=0.3, max_tokens=1500, use_cache=True,
+                                 caller="unknown") -> str:
+    return await asyncio.to_thread(
+        call_yandex_lite, messages, temperature, max_tokens, use_cache, caller
+    )
+
+
+async def gather_bounded(func, items, limit: int = AI_CONCURRENCY, timeout: float = None,
+                         on_done=None) -> list:
+    """
+    Выполняет func(item) для каждого элемента, не более limit одновременно.
+    Порядок результатов совпадает с порядком items.
+    Каждый элемент результата — пара (result, error): ошибка одного
+    элемента не прерывает обработку остальных.
+
+    timeout — предел выполнения одного элемента в секундах, отсчитывается
+    с момента, когда элемент начал выполняться в потоке (а не встал в очередь).
+    По истечении элемент получает (None, TimeoutError); запросы к модели
+    внутри него ограничены тем же сроком через request_deadline.
+    on_done(index, result, error) вызывается по завершении каждого элемента
+    в потоке, запустившем цикл событий.
+    """
+    limit = max(1, limit)
+    semaphore = asyncio.Semaphore(limit)
+    loop = asyncio.get_running_loop()
+    # Собственный пул, чтобы не ждать зависшие по таймауту потоки при выходе.
+    executor = ThreadPoolExecutor(max_workers=limit)
+
+    async def run_one(index, item):
+        started = loop.create_future()
+
+        def run_item():
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+            if timeout is not None:
+                request_deadline.set(time.monotonic() + timeout)
+            return func(item)
+
+        async with semaphore:
+            future = loop.run_in_executor(
+                executor, functools.partial(contextvars.copy_context().run, run_item)
+            )
+            try:
+                # Ждём начала выполнения: поток может быть ещё занят элементом,
+                # брошенным по таймауту.
+                await asyncio.wait({started, future}, return_when=asyncio.FIRST_COMPLETED)
+                outcome = await asyncio.wait_for(future, timeout), None
+            except asyncio.TimeoutError:
+                outcome = None, TimeoutError(f"Превышено время ожидания ({timeout} с)")
+            except Exception as e:
+                outcome = None, e
+
+        if on_done is not None:
+            on_done(index, *outcome)
+        return outcome
+
+    try:
+        return await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_bounded(func, items, limit: int = AI_CONCURRENCY, timeout: float = None,
+                on_done=None) -> list:
+    """
+    Синхронная обёртка над gather_bounded для кода Streamlit и CLI.
+    """
+    return asyncio.run(gather_bounded(func, list(items), limit, timeout, on_done))
+
+
+def _as_messages(prompt):
+    if isinstance(prompt, str):
+        return [{"role": "user", "text": prompt}]
+    return prompt
+
+
+async def async_call_yandex_lite_many(prompts, limit: int = AI_CONCURRENCY,
+                                      temperature=0.3, max_tokens=1500, caller="unknown") -> list:
+    """
+    Отправляет список промптов (строк или списков messages) с ограничением
+    параллельности. Возвращает [(text, error)] в порядке prompts.
+    """
+    def call(prompt):
+        return call_yandex_lite(
+            _as_messages(prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            caller=caller
+        )
+
+    return await gather_bounded(call, prompts, limit)
+
+
+def call_yandex_lite_many(prompts, limit: int = AI_CONCURRENCY,
+                          temperature=0.3, max_tokens=1500, caller="unknown") -> list:
+    return asyncio.run(
+        async_call_yandex_lite_many(list(prompts), limit, temperature, max_tokens, caller)
+    )
+
+
 def detect_profile_type(profile: str) -> str:
     p = (profile or "").lower()
 
@@ -168,7 +812,7 @@ def get_profile_warning(profile: str) -> str:
 """
 
 
-def consult_with_methodologist(prompt: str, plan_context: dict = None) -> str:
+def _build_methodologist_messages(prompt: str, plan_context: dict = None) -> list:
     context_info = ""
 
     if plan_context:
@@ -221,12 +865,20 @@ def consult_with_methodologist(prompt: str, plan_context: dict = None) -> str:
 
     messages.append({"role": "user", "text": prompt})
 
+    return messages
+
+
+def consult_with_methodologist(prompt: str, plan_context: dict = None) -> str:
+    messages = _build_methodologist_messages(prompt, plan_context)
+
     try:
         result = post_to_yandex(
             messages=messages,
             model_name=YANDEX_MODEL_CHAT,
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=2000,
+            use_cache=False,
+            caller="consult_with_methodologist"
         )
 
         return result["result"]["alternatives"][0]["message"]["text"]
@@ -235,6 +887,26 @@ def consult_with_methodologist(prompt: str, plan_context: dict = None) -> str:
         return f"Извините, произошла ошибка при обращении к методисту: {e}"
 
 
+def consult_with_methodologist_stream(prompt: str, plan_context: dict = None):
+    """
+    Потоковый вариант consult_with_methodologist: отдаёт ответ методиста
+    по частям, чтобы чат начинал отрисовку с первых токенов.
+    """
+    messages = _build_methodologist_messages(prompt, plan_context)
+
+    try:
+        yield from stream_from_yandex(
+            messages=messages,
+            model_name=YANDEX_MODEL_CHAT,
+            temperature=0.3,
+            max_tokens=2000,
+            caller="consult_with_methodologist"
+        )
+
+    except Exception as e:
+        yield f"Извините, произошла ошибка при обращении к методисту: {e}"
+
+
 def completion_with_ai(prompt: str) -> str:
     system_prompt = """
 Ты — система редактирования учебного плана.
@@ -327,7 +999,9 @@ ERROR:
             messages=messages,
             model_name=YANDEX_MODEL_CHAT,
             temperature=0.02,
-            max_tokens=500
+            max_tokens=500,
+            caller="completion_with_ai",
+            validate=is_json_answer
         )
 
         text = result["result"]["alternatives"][0]["message"]["text"]
@@ -342,11 +1016,9 @@ ERROR:
         }, ensure_ascii=False)
 
 
-def enrich_discipline_metadata(discipline, df_fgos, tf_struct, profile="", fgos_text=""):
+def _enrichment_context(df_fgos, tf_struct):
     import pandas as pd
 
-    discipline_name = discipline.get("name", "") if isinstance(discipline, dict) else str(discipline)
-
     if df_fgos is None or (isinstance(df_fgos, pd.DataFrame) and df_fgos.empty):
         fgos_json = "[]"
         competencies_list = []
@@ -370,6 +1042,43 @@ def enrich_discipline_metadata(discipline, df_fgos, tf_struct, profile="", fgos_
         elif tf_code:
             tf_info.append(tf_code)
 
+    return fgos_json, competencies_list, tf_info
+
+
+def _validate_enrichment(result, competencies_list) -> dict:
+    if not isinstance(result, dict):
+        result = {}
+
+    if not isinstance(result.get("competencies"), list):
+        result["competencies"] = []
+
+    if not isinstance(result.get("TF"), list):
+        result["TF"] = []
+
+    if not isinstance(result.get("reason"), str):
+        result["reason"] = ""
+
+    valid_competencies = set(str(x) for x in competencies_list)
+
+    result["competencies"] = [
+        c for c in result["competencies"]
+        if str(c) in valid_competencies
+    ][:4]
+
+    result["TF"] = result["TF"][:3]
+
+    return result
+
+
+def _discipline_name(discipline) -> str:
+    return discipline.get("name", "") if isinstance(discipline, dict) else str(discipline)
+
+
+def enrich_discipline_metadata(discipline, df_fgos, tf_struct, profile="", fgos_text=""):
+    discipline_name = _discipline_name(discipline)
+
+    fgos_json, competencies_list, tf_info = _enrichment_context(df_fgos, tf_struct)
+
     profile_warning = get_profile_warning(profile)
 
     prompt = f"""
@@ -416,34 +1125,135 @@ def enrich_discipline_metadata(discipline, df_fgos, tf_struct, profile="", fgos_
         raw = call_yandex_lite(
             [{"role": "user", "text": prompt}],
             temperature=0.03,
-            max_tokens=800
+            max_tokens=800,
+            caller="enrich_discipline_metadata",
+            validate=is_json_answer
         )
 
-        result = extract_json(raw)
+        return _validate_enrichment(extract_json(raw), competencies_list)
+
+    except Exception:
+        return {
+            "competencies": [],
+            "TF": [],
+            "reason": ""
+        }
+
 
-        if not isinstance(result.get("competencies"), list):
-            result["competencies"] = []
+def _enrich_chunk(chunk, df_fgos, tf_struct, profile, fgos_text) -> dict:
+    """
+    Обогащает пачку дисциплин одним запросом: общий контекст
+    (профиль, компетенции, ФГОС, ТФ) отправляется один раз.
+    Возвращает {название: метаданные} только для корректно разобранных
+    дисциплин; остальные вызывающий код дообогащает поштучно.
+    """
+    names = [_discipline_name(d) for d in chunk]
 
-        if not isinstance(result.get("TF"), list):
-            result["TF"] = []
+    fgos_json, competencies_list, tf_info = _enrichment_context(df_fgos, tf_struct)
 
-        if not isinstance(result.get("reason"), str):
-            result["reason"] = ""
+    profile_warning = get_profile_warning(profile)
 
-        valid_competencies = set(str(x) for x in competencies_list)
+    numbered = "\n".join(f"{i}. {name}" for i, name in enumerate(names, 1))
 
-        result["competencies"] = [
-            c for c in result["competencies"]
-            if str(c) in valid_competencies
-        ][:4]
+    prompt = f"""
+Ты — методист российского вуза.
 
-        result["TF"] = result["TF"][:3]
+Профиль подготовки:
+{profile}
 
-        return result
+{profile_warning}
 
-    except Exception:
-        return {
-            "competencies": [],
-            "TF": [],
-            "reason": ""
-        }
\ No newline at end of file
+Доступные компетенции ФГОС:
+{', '.join(competencies_list[:25]) if competencies_list else 'Не указаны'}
+
+Полный список компетенций:
+{fgos_json[:2500]}
+
+Трудовые функции профстандарта:
+{chr(10).join(tf_info) if tf_info else 'Не указаны'}
+
+Дисциплины:
+{numbered}
+
+ЗАДАЧА — по каждой дисциплине из списка:
+1. Выбери 2-4 компетенции ФГОС, которые реально формирует дисциплина.
+2. Выбери 0-3 трудовые функции, которые реально поддерживает дисциплина.
+3. Напиши короткое конкретное обоснование.
+
+ЖЁСТКИЕ ПРАВИЛА:
+1. Не используй педагогические формулировки для непедагогического профиля.
+2. Не связывай технические дисциплины с воспитанием, обучающимися и методикой преподавания.
+3. Не связывай художественные дисциплины с программированием, если это не указано в названии.
+4. Используй только компетенции из списка.
+5. Ключ — точное название дисциплины из списка.
+6. Верни только JSON.
+
+Формат:
+{{
+  "Название дисциплины": {{
+    "competencies": ["УК-1", "ОПК-2"],
+    "TF": ["A/01.3"],
+    "reason": "Краткое обоснование"
+  }}
+}}
+"""
+
+    raw = call_yandex_lite(
+        [{"role": "user", "text": prompt}],
+        temperature=0.03,
+        max_tokens=min(7000, 300 + 250 * len(names)),
+        caller="enrich_disciplines_batch",
+        validate=is_json_answer
+    )
+
+    data = extract_json(raw)
+    if data.get("action") == "error":
+        return {}
+
+    by_lower = {
+        str(key).strip().lower(): value
+        for key, value in data.items()
+        if isinstance(value, dict)
+    }
+
+    result = {}
+    for name in names:
+        item = by_lower.get(name.strip().lower())
+        if item is not None:
+            result[name] = _validate_enrichment(item, competencies_list)
+
+    return result
+
+
+def enrich_disciplines_batch(disciplines, df_fgos, tf_struct, profile="", fgos_text="",
+                             chunk_size=ENRICH_BATCH_SIZE) -> dict:
+    """
+    Пакетный вариант enrich_discipline_metadata.
+    Дисциплины отправляются пачками по chunk_size, пачки — параллельно.
+    Если пачка не разобралась или в ответе нет какой-то дисциплины,
+    для неё выполняется обычный поштучный запрос.
+    Возвращает {название дисциплины: метаданные}.
+    """
+    disciplines = list(disciplines)
+    chunks = [
+        disciplines[i:i + chunk_size]
+        for i in range(0, len(disciplines), max(1, chunk_size))
+    ]
+
+    enriched = {}
+    for meta, _error in run_bounded(
+        lambda chunk: _enrich_chunk(chunk, df_fgos, tf_struct, profile, fgos_text),
+        chunks
+    ):
+        if meta:
+            enriched.update(meta)
+
+    missing = [d for d in disciplines if _discipline_name(d) not in enriched]
+
+    for d, (meta, _error) in zip(missing, run_bounded(
+        lambda d: enrich_discipline_metadata(d, df_fgos, tf_struct, profile, fgos_text),
+        missing
+    )):
+        enriched[_discipline_name(d)] = meta or {"competencies": [], "TF": [], "reason": ""}
+
+    return enriched
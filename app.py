@@ -7,7 +7,15 @@ import time
 from plan import generate_plan_pipeline
 from ai import completion_with_ai
 from fgos import extract_text_from_pdf_file, extract_competencies_full, detect_profile_from_fgos
-from profstandart import analyze_prof_standard
+from profstandart import (
+    analyze_prof_standard,
+    detect_registration_number,
+    detect_prof_title,
+    incomplete_tf_codes,
+)
+from document import TextDocument
+from fgos_store import FgosStore
+from prof_library import ProfLibrary, document_hash
 
 import streamlit as st
 
@@ -144,6 +152,21 @@ def select_or_custom(label: str, options: list[str], default: str = "", key: str
 
     return selected
 
+def show_tf_table(tf_list: list, message: str) -> None:
+    tf_display = []
+    for tf in tf_list:
+        tf_display.append({
+            "Код": tf.get("code", ""),
+            "Название": (tf.get("name") or "")[:100],
+            "Действия": len(tf.get("actions") or []),
+            "Знания": len(tf.get("knowledge") or []),
+            "Умения": len(tf.get("skills") or [])
+        })
+
+    st.success(f"{message} Найдено ТФ: {len(tf_list)}")
+    st.dataframe(pd.DataFrame(tf_display), use_container_width=True, height=300)
+
+
 def apply_edit_command(df: pd.DataFrame, command: dict) -> tuple[pd.DataFrame, str]:
     action = command.get("action")
 
@@ -200,6 +223,50 @@ def apply_edit_command(df: pd.DataFrame, command: dict) -> tuple[pd.DataFrame, s
         return df, f"Неизвестное действие: {action}"
 
 
+with st.sidebar.expander("📈 Метрики вызовов ИИ", expanded=False):
+    from ai import llm_metrics
+
+    metrics_summary = llm_metrics.summary()
+
+    if metrics_summary["stages"]:
+        st.dataframe(
+            pd.DataFrame(metrics_summary["stages"])[
+                ["caller", "calls", "errors", "cache_hits", "wall_time", "total_tokens"]
+            ],
+            use_container_width=True
+        )
+    else:
+        st.caption("Вызовов модели пока не было.")
+
+    st.caption(
+        f"Кэш: попаданий {metrics_summary['cache']['hits']}, "
+        f"промахов {metrics_summary['cache']['misses']}"
+    )
+
+    # Выгрузки собираются только по запросу, а не на каждом перезапуске скрипта.
+    if st.button("Подготовить выгрузку", use_container_width=True):
+        st.session_state["llm_metrics_exports"] = (
+            llm_metrics.to_json(),
+            llm_metrics.to_prometheus(),
+        )
+
+    if "llm_metrics_exports" in st.session_state:
+        metrics_json, metrics_prometheus = st.session_state["llm_metrics_exports"]
+        st.download_button(
+            "Скачать JSON",
+            metrics_json,
+            "llm_metrics.json",
+            "application/json",
+            use_container_width=True
+        )
+        st.download_button(
+            "Скачать Prometheus",
+            metrics_prometheus,
+            "llm_metrics.prom",
+            "text/plain",
+            use_container_width=True
+        )
+
 tab_plan, tab_chat, tab_rpd = st.tabs([
     "📘 Учебный план",
     "💬 Чат с ИИ",
@@ -209,12 +276,65 @@ tab_plan, tab_chat, tab_rpd = st.tabs([
 with tab_plan:
     st.header("Генерация учебного плана")
 
-    uploaded_fgos = st.file_uploader("Загрузите ФГОС", type=["pdf", "txt"], key="fgos_uploader")
-    uploaded_tf = st.file_uploader(
-        "Загрузите профстандарт (необязательно)",
-        type=["pdf", "txt"],
-        key="prof_uploader"
-    )
+    fgos_store = FgosStore()
+    fgos_library = fgos_store.list_standards()
+
+    fgos_source = "Загрузить файл"
+    if fgos_library:
+        fgos_source = st.radio(
+            "Источник ФГОС",
+            ["Загрузить файл", "Библиотека ФГОС"],
+            horizontal=True,
+            key="fgos_source"
+        )
+
+    uploaded_fgos = None
+    selected_fgos = None
+
+    if fgos_source == "Загрузить файл":
+        uploaded_fgos = st.file_uploader("Загрузите ФГОС", type=["pdf", "txt"], key="fgos_uploader")
+    else:
+        selected_fgos = st.selectbox(
+            "Выберите ФГОС",
+            fgos_library,
+            format_func=lambda item: (
+                f"{item['direction_code']} {item['title']} "
+                f"({item['version']}, компетенций: {item['competencies_count']})"
+            ),
+            key="fgos_library_item"
+        )
+
+    prof_library = ProfLibrary()
+    prof_catalog = prof_library.list_standards()
+
+    prof_source = "Загрузить файл"
+    if prof_catalog:
+        prof_source = st.radio(
+            "Источник профстандарта",
+            ["Загрузить файл", "Библиотека профстандартов"],
+            horizontal=True,
+            key="prof_source"
+        )
+
+    uploaded_tf = None
+    selected_prof = None
+
+    if prof_source == "Загрузить файл":
+        uploaded_tf = st.file_uploader(
+            "Загрузите профстандарт (необязательно)",
+            type=["pdf", "txt"],
+            key="prof_uploader"
+        )
+    else:
+        selected_prof = st.selectbox(
+            "Выберите профстандарт",
+            prof_catalog,
+            format_func=lambda item: (
+                f"{item['reg_number'] or 'без номера'} {item['title'] or item['source']} "
+                f"(версия {item['version']}, ТФ: {item['tf_count']})"
+            ),
+            key="prof_library_item"
+        )
 
     # Инициализация session_state
     if "df_fgos" not in st.session_state:
@@ -232,7 +352,30 @@ with tab_plan:
     if "detected_profiles" not in st.session_state:
         st.session_state.detected_profiles = []
 
+    if selected_fgos:
+        library_key = (selected_fgos["direction_code"], selected_fgos["version"])
+
+        # Стандарт из библиотеки загружается один раз, а не на каждом перезапуске скрипта
+        if st.session_state.get("fgos_library_key") != library_key:
+            record = fgos_store.load(*library_key)
+            if record:
+                st.session_state.fgos_text = record["text"]
+                st.session_state.df_fgos = pd.DataFrame(record["competencies"])
+                st.session_state.detected_profiles = []
+                try:
+                    st.session_state.detected_profiles = detect_profile_from_fgos(record["text"]) or []
+                except Exception as e:
+                    st.warning(f"⚠️ Не удалось определить профиль: {e}")
+            st.session_state.fgos_library_key = library_key
+
+        if not st.session_state.df_fgos.empty:
+            st.success(f"✅ ФГОС из библиотеки. Компетенций: {len(st.session_state.df_fgos)}")
+            st.dataframe(st.session_state.df_fgos, use_container_width=True, height=300)
+            if st.session_state.detected_profiles:
+                st.info(f"🎯 Определенный профиль: {', '.join(st.session_state.detected_profiles)}")
+
     if uploaded_fgos:
+        st.session_state.pop("fgos_library_key", None)
         with st.spinner("Обработка ФГОС..."):
             try:
                 if uploaded_fgos.name.endswith(".pdf"):
@@ -240,7 +383,7 @@ with tab_plan:
                     if fgos_text.startswith("OCR error") or len(fgos_text.strip()) < 50:
                         st.warning("⚠️ Возможны проблемы с извлечением текста из PDF.")
                 else:
-                    fgos_text = uploaded_fgos.read().decode("utf-8", errors="ignore")
+                    fgos_text = TextDocument(uploaded_fgos.read().decode("utf-8", errors="ignore"))
                     uploaded_fgos.seek(0)
 
                 if not fgos_text or len(fgos_text.strip()) < 50:
@@ -273,13 +416,34 @@ with tab_plan:
                 st.session_state.fgos_text = ""
                 st.error(f"Ошибка при обработке ФГОС: {e}")
 
-    if uploaded_tf:
+    if selected_prof:
+        tf_struct = prof_library.get_by_hash(selected_prof["sha256"]) or {"TF": []}
+        st.session_state.tf_struct = tf_struct
+        st.session_state.prof_text = ""
+        if tf_struct.get("TF"):
+            show_tf_table(tf_struct["TF"], "✅ Профстандарт из библиотеки.")
+
+    prof_hash = document_hash(uploaded_tf.getvalue()) if uploaded_tf else None
+    prof_cached = None
+    if prof_hash and st.session_state.get("prof_reanalyze_hash") != prof_hash:
+        prof_cached = prof_library.get_by_hash(prof_hash)
+
+    if prof_cached and prof_cached.get("TF") and not incomplete_tf_codes(prof_cached):
+        # Этот файл уже разобран — берём ТФ из библиотеки без повторного анализа.
+        st.session_state.tf_struct = prof_cached
+        show_tf_table(prof_cached["TF"], "✅ Профстандарт найден в библиотеке.")
+
+        if st.button("🔄 Проанализировать заново", key="prof_reanalyze"):
+            st.session_state.prof_reanalyze_hash = prof_hash
+            st.rerun()
+
+    elif uploaded_tf:
         with st.spinner("Обработка профстандарта..."):
             try:
                 if uploaded_tf.name.endswith(".pdf"):
                     prof_text = extract_text_from_pdf_file(uploaded_tf)
                 else:
-                    prof_text = uploaded_tf.read().decode("utf-8", errors="ignore")
+                    prof_text = TextDocument(uploaded_tf.read().decode("utf-8", errors="ignore"))
                     uploaded_tf.seek(0)
 
                 if not prof_text or len(prof_text.strip()) < 50:
@@ -288,7 +452,17 @@ with tab_plan:
                     st.warning("⚠️ Не удалось извлечь текст из профстандарта.")
                 else:
                     st.session_state.prof_text = prof_text
-                    tf_struct, error = analyze_prof_standard(prof_text)
+                    tf_progress = st.progress(0.0, text="Анализ трудовых функций...")
+
+                    def show_tf_progress(done, total, code):
+                        tf_progress.progress(done / total, text=f"Проанализировано ТФ: {done} из {total} ({code})")
+
+                    tf_struct, error = analyze_prof_standard(
+                        prof_text,
+                        progress_callback=show_tf_progress,
+                        refresh=st.session_state.get("prof_reanalyze_hash") == prof_hash
+                    )
+                    tf_progress.empty()
 
                     if error:
                         st.session_state.tf_struct = {"TF": []}
@@ -299,19 +473,26 @@ with tab_plan:
                         tf_list = tf_struct.get("TF", [])
 
                         if tf_list:
-                            tf_display = []
-                            for tf in tf_list:
-                                tf_display.append({
-                                    "Код": tf.get("code", ""),
-                                    "Название": (tf.get("name") or "")[:100],
-                                    "Действия": len(tf.get("actions") or []),
-                                    "Знания": len(tf.get("knowledge") or []),
-                                    "Умения": len(tf.get("skills") or [])
-                                })
-
-                            df_tf = pd.DataFrame(tf_display)
-                            st.success(f"✅ Профстандарт обработан. Найдено ТФ: {len(tf_list)}")
-                            st.dataframe(df_tf, use_container_width=True, height=300)
+                            failed_codes = incomplete_tf_codes(tf_struct)
+
+                            # Неполный разбор (ошибки или таймауты модели) в библиотеку
+                            # не попадает: следующая загрузка файла проанализирует его заново.
+                            if failed_codes:
+                                st.warning(
+                                    "⚠️ Не удалось проанализировать ТФ: "
+                                    f"{', '.join(failed_codes)}. Результат не сохранён в библиотеку."
+                                )
+                            else:
+                                prof_library.save(
+                                    prof_hash,
+                                    tf_struct,
+                                    reg_number=detect_registration_number(prof_text),
+                                    title=detect_prof_title(prof_text),
+                                    source=uploaded_tf.name
+                                )
+                                st.session_state.pop("prof_reanalyze_hash", None)
+
+                            show_tf_table(tf_list, "✅ Профстандарт обработан.")
                         else:
                             st.session_state.tf_struct = {"TF": []}
                             st.warning("⚠️ Трудовые функции не найдены в профстандарте.")
@@ -389,7 +570,7 @@ with tab_chat:
             st.rerun()
 
         if st.session_state.chat_mode == "consultation":
-            from ai import consult_with_methodologist
+            from ai import consult_with_methodologist_stream
 
             if "consultation_messages" not in st.session_state:
                 st.session_state.consultation_messages = []
@@ -411,8 +592,12 @@ with tab_chat:
 
             if prompt:
                 st.session_state.consultation_messages.append({"role": "user", "content": prompt})
+                st.chat_message("user").write(prompt)
                 try:
-                    response = consult_with_methodologist(prompt, plan_context)
+                    with st.chat_message("assistant"):
+                        response = st.write_stream(
+                            consult_with_methodologist_stream(prompt, plan_context)
+                        )
                 except Exception as e:
                     response = f"Ошибка при обращении к методисту: {str(e)}"
                 st.session_state.consultation_messages.append({"role": "assistant", "content": response})
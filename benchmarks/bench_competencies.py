@@ -0,0 +1,115 @@
+"""
+Сравнение однопроходного extract_competencies_full с прежним
+регулярным выражением (ленивый DOTALL .*? с многовариантным lookahead)
+на больших зашумлённых текстах ФГОС.
+
+Запуск из корня проекта:
+    python benchmarks/bench_competencies.py --sizes 50 200 1000 --repeat 3
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fgos import extract_competencies_full  # noqa: E402
+
+LEGACY_PATTERN = (
+    r"(УК-\d+|ОПК-\d+|ПК-\d+)\.?\s*(.*?)\s*"
+    r"(?=(УК-\d+|ОПК-\d+|ПК-\d+|IV\. Требования к условиям реализации программы бакалавриата|$))"
+)
+
+WORDS = (
+    "способен осуществлять поиск критический анализ синтез информации применять "
+    "системный подход для решения поставленных задач разрабатывать программное "
+    "обеспечение проектировать информационные системы участвовать в разработке"
+).split()
+
+
+def legacy_extract(text):
+    competencies = []
+    for code, desc, _ in re.findall(LEGACY_PATTERN, text, re.DOTALL):
+        competencies.append({"code": code, "description": " ".join(desc.split())})
+    return competencies
+
+
+def synthetic_fgos(size_kb: int, seed: int = 0) -> str:
+    """
+    Текст заданного размера: оглавление с кодами, разделы с описаниями
+    компетенций, OCR-шум (лишние пробелы, переносы, мусорные символы).
+    """
+    rnd = random.Random(seed)
+    parts = ["Оглавление\n"]
+    parts.extend(f"УК-{i} .......... {i + 2}\n" for i in range(1, 11))
+
+    target = size_kb * 1024
+    length = sum(len(p) for p in parts)
+    counter = 0
+
+    while length < target:
+        counter += 1
+        prefix = rnd.choice(["УК", "ОПК", "ПК"])
+        number = counter % 40 + 1
+        # Часть кодов — в OCR-вариантах, которые прежний шаблон не видит.
+        code = rnd.choice([
+            f"{prefix}-{number}",
+            f"{prefix}-{number}",
+            f"{prefix} - {number}",
+            f"{prefix.replace('К', 'K')}-{number}",
+        ])
+        desc = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(15, 80)))
+        noise = "".join(rnd.choice(" \n\t.,;|") for _ in range(rnd.randint(0, 20)))
+        chunk = f"{code}. {desc}{noise}\n"
+        parts.append(chunk)
+        length += len(chunk)
+
+    parts.append("IV. Требования к условиям реализации программы бакалавриата\n")
+    return "".join(parts)
+
+
+def timed(func, text, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000], help="размеры текста, КБ")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="путь для JSON с результатами")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        text = synthetic_fgos(size)
+        legacy_time, legacy = timed(legacy_extract, text, args.repeat)
+        scanner_time, scanner = timed(extract_competencies_full, text, args.repeat)
+
+        row = {
+            "size_kb": size,
+            "legacy_seconds": round(legacy_time, 5),
+            "scanner_seconds": round(scanner_time, 5),
+            "speedup": round(legacy_time / scanner_time, 2) if scanner_time else None,
+            "legacy_matches": len(legacy),
+            "scanner_competencies": len(scanner),
+        }
+        results.append(row)
+        print(json.dumps(row, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
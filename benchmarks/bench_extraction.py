@@ -0,0 +1,220 @@
+"""
+Масштабирование извлечения на синтетических PDF: ФГОС и профстандарты
+от 10 до 500 страниц, с текстовым слоем и только из изображений (сканы).
+
+Для каждого документа в отдельном процессе измеряются время
+extract_text_from_pdf_file, extract_competencies_full / extract_tf_codes_smart,
+страниц в секунду и пиковый RSS. Кэш извлечения отключается.
+
+Запуск из корня проекта:
+    python benchmarks/bench_extraction.py --pages 10 100 500 --scan-pages 10 50 \
+        --output bench_extraction.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+WORDS = (
+    "способен осуществлять поиск критический анализ синтез информации применять "
+    "системный подход разрабатывать программное обеспечение проектировать "
+    "информационные системы участвовать в разработке технической документации"
+).split()
+
+LINES_PER_PAGE = 45
+
+
+def _find_font(path=None):
+    for candidate in [path] + FONT_CANDIDATES:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _sentence(rnd, low=8, high=20) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(low, high)))
+
+
+def fgos_lines(pages: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    lines = [
+        "ФЕДЕРАЛЬНЫЙ ГОСУДАРСТВЕННЫЙ ОБРАЗОВАТЕЛЬНЫЙ СТАНДАРТ ВЫСШЕГО ОБРАЗОВАНИЯ",
+        "бакалавриат по направлению подготовки 09.03.01 Информатика и вычислительная техника",
+    ]
+    counter = 0
+    while len(lines) < pages * LINES_PER_PAGE:
+        counter += 1
+        prefix = ("УК", "ОПК", "ПК")[counter % 3]
+        lines.append(f"{prefix}-{counter % 40 + 1}. Способен {_sentence(rnd)}")
+        lines.extend(_sentence(rnd) for _ in range(rnd.randint(0, 3)))
+    lines.append("IV. Требования к условиям реализации программы бакалавриата")
+    return lines
+
+
+def prof_lines(pages: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    lines = ["ПРОФЕССИОНАЛЬНЫЙ СТАНДАРТ", "Программист"]
+    letter, number = 0, 0
+    while len(lines) < pages * LINES_PER_PAGE:
+        number += 1
+        if number > 6:
+            letter, number = letter + 1, 1
+        code = f"{'ABCDEFGH'[letter % 8]}/{number:02d}.{rnd.randint(5, 7)}"
+        lines.append(f"3.1.{number}. Трудовая функция")
+        lines.append(f"Наименование {_sentence(rnd, 4, 8)} Код {code}")
+        for section in ("Трудовые действия", "Необходимые умения", "Необходимые знания"):
+            lines.append(section)
+            lines.extend(_sentence(rnd) for _ in range(rnd.randint(3, 6)))
+    return lines
+
+
+def build_pdf(lines: list, path: str, scanned: bool, font: str = None, dpi: int = 150) -> int:
+    """
+    Пишет PDF по LINES_PER_PAGE строк на страницу. scanned=True —
+    каждая страница растеризуется и сохраняется только как изображение.
+    """
+    import fitz  # PyMuPDF
+
+    text_doc = fitz.open()
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = text_doc.new_page(width=595, height=842)
+        chunk = "\n".join(line[:110] for line in lines[start:start + LINES_PER_PAGE])
+        if font:
+            page.insert_text((36, 40), chunk, fontsize=8, fontname="body", fontfile=font)
+        else:
+            page.insert_text((36, 40), chunk, fontsize=8)
+
+    if not scanned:
+        text_doc.save(path, garbage=3, deflate=True)
+        return text_doc.page_count
+
+    image_doc = fitz.open()
+    for page in text_doc:
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image_page = image_doc.new_page(width=page.rect.width, height=page.rect.height)
+        image_page.insert_image(image_page.rect, stream=pix.tobytes("png"))
+    image_doc.save(path, garbage=3, deflate=True)
+    return image_doc.page_count
+
+
+def run_case(path: str, kind: str) -> dict:
+    """
+    Выполняется в дочернем процессе, чтобы пиковый RSS относился к одному документу.
+    """
+    import resource
+
+    from fgos import extract_text_from_pdf_file, extract_competencies_full
+    from profstandart import extract_tf_codes_smart
+
+    started = time.perf_counter()
+    text = extract_text_from_pdf_file(path)
+    extract_seconds = time.perf_counter() - started
+
+    parser = extract_competencies_full if kind == "fgos" else extract_tf_codes_smart
+    started = time.perf_counter()
+    found = parser(text)
+    parse_seconds = time.perf_counter() - started
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss — килобайты в Linux и байты в macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    pages = len(getattr(text, "pages", [])) or 1
+
+    return {
+        "extract_seconds": round(extract_seconds, 4),
+        "parse_seconds": round(parse_seconds, 4),
+        "total_seconds": round(extract_seconds + parse_seconds, 4),
+        "pages_per_second": round(pages / extract_seconds, 2) if extract_seconds else None,
+        "peak_rss_mb": round(rss * scale / 2 ** 20, 1),
+        "peak_child_rss_mb": round(children * scale / 2 ** 20, 1),
+        "chars": len(text),
+        "found": len(found),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500],
+                        help="размеры документов с текстовым слоем, страниц")
+    parser.add_argument("--scan-pages", type=int, nargs="+", default=[10, 50],
+                        help="размеры сканированных документов, страниц (0 — не измерять)")
+    parser.add_argument("--kinds", nargs="+", choices=["fgos", "prof"], default=["fgos", "prof"])
+    parser.add_argument("--font", help="TTF-шрифт с кириллицей для генерации PDF")
+    parser.add_argument("--workers", type=int, help="PDF_WORKERS для извлечения")
+    parser.add_argument("--output", help="путь для JSON с результатами")
+    parser.add_argument("--run-case", nargs=2, metavar=("PDF", "KIND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(*args.run_case)))
+        return
+
+    font = _find_font(args.font)
+    if not font:
+        print("Шрифт с кириллицей не найден — кириллица в PDF может не отрисоваться (--font).",
+              file=sys.stderr)
+
+    env = dict(os.environ, EXTRACTION_CACHE="0")
+    if args.workers:
+        env["PDF_WORKERS"] = str(args.workers)
+
+    cases = [(pages, False) for pages in args.pages]
+    cases += [(pages, True) for pages in args.scan_pages if pages > 0]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.kinds:
+            for pages, scanned in cases:
+                lines = fgos_lines(pages) if kind == "fgos" else prof_lines(pages)
+                path = os.path.join(tmp, f"{kind}-{pages}-{'scan' if scanned else 'text'}.pdf")
+                page_count = build_pdf(lines, path, scanned, font)
+
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--run-case", path, kind],
+                    capture_output=True, text=True, env=env, cwd=ROOT
+                )
+                if completed.returncode != 0:
+                    print(completed.stderr, file=sys.stderr)
+                    continue
+
+                row = {
+                    "kind": kind,
+                    "layer": "scan" if scanned else "text",
+                    "pages": page_count,
+                    "file_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+                }
+                row.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+                results.append(row)
+                print(json.dumps(row, ensure_ascii=False))
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pdf_workers": args.workers or os.getenv("PDF_WORKERS") or os.cpu_count(),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+DATA_DIR = os.getenv(
+    "STUDY_PLAN_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+)
+
+
+def make_key(*parts) -> str:
+    """
+    Стабильный ключ кэша: SHA-256 от канонического JSON всех частей.
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def open_sqlite(path: str, schema: str) -> sqlite3.Connection:
+    """
+    Соединение SQLite для хранилищ приложения: создаёт каталог, включает
+    WAL и выполняет schema (CREATE TABLE/INDEX IF NOT EXISTS ...).
+    Соединение используется из нескольких потоков, поэтому вызывающий
+    код защищает обращения к нему собственной блокировкой.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(schema)
+    conn.commit()
+    return conn
+
+
+class DiskCache:
+    """
+    Персистентный кэш «ключ → строка» на SQLite.
+
+    - вытеснение LRU по суммарному размеру значений (max_bytes);
+    - необязательный TTL в секундах (ttl=None — без срока жизни);
+    - счётчики попаданий, промахов и вытеснений;
+    - compress=True хранит значения сжатыми zlib (размер считается по сжатым).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 200 * 1024 * 1024, ttl: float = None,
+                 compress: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress = compress
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = open_sqlite(self.path, """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+            """)
+        return self._conn
+
+    def get(self, key: str):
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created = row
+
+            if self.ttl is not None and now - created > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.commit()
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+
+        if self.compress:
+            return zlib.decompress(value).decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+
+        if self.compress:
+            payload = zlib.compress(value.encode("utf-8"), 6)
+            size = len(payload)
+        else:
+            payload = value
+            size = len(value.encode("utf-8"))
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
@@ -1,5 +1,5 @@
 import json
-from ai import call_yandex_lite
+from ai import call_yandex_lite, is_json_answer
 
 
 PROFILE_FUNDAMENTALS = {
@@ -642,7 +642,9 @@ def generate_disciplines(profile, df_fgos=None, tf_struct=None, fgos_text="", mi
     raw = call_yandex_lite(
         [{"role": "user", "text": prompt}],
         temperature=0.03,
-        max_tokens=3000
+        max_tokens=3000,
+        caller="generate_disciplines",
+        validate=is_json_answer
     )
 
     try:
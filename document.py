@@ -0,0 +1,96 @@
+from bisect import bisect_right
+from functools import cached_property
+
+
+class TextDocument(str):
+    """
+    Извлечённый текст документа с постраничной структурой.
+
+    Это обычная строка (весь текст, страницы подряд), поэтому существующий
+    код работает с ней без изменений. Дополнительно доступны страницы,
+    смещения страниц и строк, а также лениво вычисляемые и кэшируемые
+    нижний регистр и разбиение на строки — их не нужно пересчитывать
+    в каждом парсере.
+    """
+
+    def __new__(cls, pages=()):
+        if isinstance(pages, str):
+            pages = [pages]
+        pages = list(pages)
+        doc = super().__new__(cls, "".join(pages))
+        doc.pages = pages
+        return doc
+
+    def __reduce__(self):
+        return TextDocument, (self.pages,)
+
+    @cached_property
+    def lowered(self) -> str:
+        return self.lower()
+
+    @cached_property
+    def lines(self) -> list:
+        return self.split("\n")
+
+    @cached_property
+    def line_offsets(self) -> list:
+        """
+        Смещение начала каждой строки в тексте.
+        """
+        offsets = []
+        position = 0
+        for line in self.lines:
+            offsets.append(position)
+            position += len(line) + 1
+        return offsets
+
+    @cached_property
+    def page_offsets(self) -> list:
+        """
+        Смещение начала каждой страницы в тексте.
+        """
+        offsets = []
+        position = 0
+        for page in self.pages:
+            offsets.append(position)
+            position += len(page)
+        return offsets
+
+    def line_at(self, offset: int) -> int:
+        return max(0, bisect_right(self.line_offsets, offset) - 1)
+
+    def page_at(self, offset: int) -> int:
+        return max(0, bisect_right(self.page_offsets, offset) - 1)
+
+    def line_span(self, first_line: int, last_line: int) -> tuple:
+        """
+        Смещения (start, end) для строк first_line..last_line-1.
+        """
+        offsets = self.line_offsets
+        first_line = max(0, min(first_line, len(offsets)))
+        last_line = max(first_line, min(last_line, len(offsets)))
+
+        start = offsets[first_line] if first_line < len(offsets) else len(self)
+        end = offsets[last_line] - 1 if last_line < len(offsets) else len(self)
+        return start, max(start, end)
+
+
+def as_document(text) -> TextDocument:
+    if isinstance(text, TextDocument):
+        return text
+    return TextDocument(text or "")
+
+
+def lowered(text) -> str:
+    """
+    Нижний регистр текста; для TextDocument берётся из кэша.
+    """
+    if isinstance(text, TextDocument):
+        return text.lowered
+    return (text or "").lower()
+
+
+def text_lines(text) -> list:
+    if isinstance(text, TextDocument):
+        return text.lines
+    return (text or "").split("\n")
@@ -1,62 +1,476 @@
-import fitz  # PyMuPDF
-import pytesseract
-from pdf2image import convert_from_bytes
+import os
 import re
 import json
-from ai import call_yandex_lite
+import mmap
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
 
+from ai import call_yandex_lite, is_json_answer
+from cache import DATA_DIR, DiskCache, make_key
+from document import TextDocument
 
+# Параллельное извлечение текста включается для документов
+# от PDF_PARALLEL_MIN_PAGES страниц.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
 
-def extract_text_from_pdf_file(uploaded_file):
+# Страница считается сканом, если в текстовом слое меньше
+# OCR_PAGE_MIN_CHARS символов, а на странице есть изображения.
+OCR_PAGE_MIN_CHARS = int(os.getenv("OCR_PAGE_MIN_CHARS", "20"))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") != "0"
+OCR_LANG = "rus+eng"
+OCR_PAGES_PER_TASK = 2
+
+# Ниже этой уверенности локального классификатора профиль уточняется у модели.
+PROFILE_MIN_CONFIDENCE = float(os.getenv("PROFILE_MIN_CONFIDENCE", "0.6"))
+
+# Версия алгоритма извлечения: входит в ключ кэша, поэтому при изменении
+# логики извлечения старые записи перестают использоваться.
+EXTRACTOR_VERSION = 1
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE", "1") != "0"
+
+extraction_cache = DiskCache(
+    os.getenv("EXTRACTION_CACHE_PATH", os.path.join(DATA_DIR, "extraction_cache.sqlite3")),
+    max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_MB", "500")) * 1024 * 1024,
+    compress=True
+)
+
+
+def _ocr_modules():
+    """
+    OCR-зависимости импортируются только при реальной необходимости,
+    чтобы модуль быстро импортировался в CLI и рабочих процессах.
+    """
+    import pytesseract
+
+    tesseract_path = os.getenv("TESSERACT_CMD")
+    if tesseract_path:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+    return pytesseract
+
+
+def _is_path(pdf) -> bool:
+    return isinstance(pdf, (str, os.PathLike))
+
+
+def _as_source(pdf):
+    """
+    Путь к файлу превращается в ("path", путь): MuPDF и воркеры открывают
+    его сами, без копии документа в памяти. Байты возвращаются как есть.
+    """
+    if _is_path(pdf):
+        return ("path", os.fspath(pdf))
+    return pdf
+
+
+def _page_ranges(page_count: int, parts: int) -> list:
+    parts = max(1, min(parts, page_count))
+    step, rest = divmod(page_count, parts)
+
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + step + (1 if i < rest else 0)
+        ranges.append((start, end))
+        start = end
+
+    return ranges
+
+
+def _open_pdf(source):
     """
-    1) Пытается извлечь текст через MuPDF.
-    2) Если текста мало (скан) — включает OCR (Tesseract).
+    source — байты PDF, ("path", путь) или ("shm", имя, размер) для воркеров,
+    получающих документ через общую память.
     """
-    uploaded_file.seek(0)
-    pdf_bytes = uploaded_file.read()
+    import fitz  # PyMuPDF
+
+    if isinstance(source, tuple) and source[0] == "path":
+        return fitz.open(source[1])
+
+    if isinstance(source, tuple):
+        _, name, size = source
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+        return fitz.open(stream=data, filetype="pdf")
+
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _run_in_pool(worker, source, tasks: list, workers: int) -> list:
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=get_context("spawn")
+    ) as pool:
+        futures = [pool.submit(worker, source, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def _run_pdf_tasks(worker, pdf, tasks: list, workers: int) -> list:
+    """
+    Выполняет worker(source, *task) для каждой задачи, результаты — в порядке задач.
+    При нескольких задачах и workers > 1 использует пул процессов:
+    файл на диске воркеры открывают по пути, а байты PDF копируются
+    в общую память один раз на весь пул.
+    """
+    local = _as_source(pdf)
+
+    if workers <= 1 or len(tasks) <= 1:
+        return [worker(local, *task) for task in tasks]
+
+    if isinstance(local, tuple):
+        try:
+            return _run_in_pool(worker, local, tasks, workers)
+        except (OSError, BrokenProcessPool):
+            return [worker(local, *task) for task in tasks]
 
-    text = ""
     try:
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            for page in doc:
-                text += page.get_text()
-    except Exception:
-        text = ""
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(local)))
+    except OSError:
+        return [worker(local, *task) for task in tasks]
 
-    if len(text.strip()) > 50:
-        return text
+    try:
+        shm.buf[:len(local)] = local
+        source = ("shm", shm.name, len(local))
+
+        try:
+            return _run_in_pool(worker, source, tasks, workers)
+
+        except (OSError, BrokenProcessPool):
+            # Процессы недоступны в этой среде — выполняем в текущем процессе.
+            return [worker(local, *task) for task in tasks]
+
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _read_pages_worker(source, start: int, end: int) -> list:
+    with _open_pdf(source) as doc:
+        pages = []
+        for i in range(start, end):
+            page = doc[i]
+            text = page.get_text()
+            needs_ocr = len(text.strip()) < OCR_PAGE_MIN_CHARS and bool(page.get_images())
+            pages.append((text, needs_ocr))
+        return pages
+
+
+def iter_ocr_pages(pdf, page_numbers: list = None, dpi: int = OCR_DPI,
+                   grayscale: bool = OCR_GRAYSCALE):
+    """
+    Потоковый OCR: растеризует страницы по одной через MuPDF, распознаёт
+    и сразу освобождает изображение. Отдаёт текст страниц по порядку
+    page_numbers (None — все страницы), поэтому пиковая память не зависит
+    от длины документа.
+
+    pdf — байты PDF, путь к файлу или источник воркера (см. _open_pdf).
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    pytesseract = _ocr_modules()
+
+    with _open_pdf(_as_source(pdf)) as doc:
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+
+        for i in page_numbers:
+            if grayscale:
+                pix = doc[i].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+                image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+            else:
+                pix = doc[i].get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            del pix
+
+            try:
+                yield pytesseract.image_to_string(image, lang=OCR_LANG)
+            finally:
+                image.close()
+
+
+def _ocr_pages_worker(source, page_numbers: list, dpi: int) -> list:
+    return list(iter_ocr_pages(source, page_numbers, dpi))
 
-    ocr_text = ""
+
+def _resolve_workers(workers) -> int:
+    # PDF_WORKERS читается при вызове, чтобы его можно было менять во время работы.
+    return PDF_WORKERS if workers is None else workers
+
+
+def read_pdf_pages(pdf, workers: int = None) -> list:
+    """
+    Для каждой страницы возвращает (текст MuPDF, нужен ли OCR), в порядке страниц.
+    pdf — байты PDF или путь к файлу.
+    Большие документы делятся на диапазоны страниц между процессами;
+    workers=None — значение PDF_WORKERS.
+    """
+    workers = _resolve_workers(workers)
+
+    with _open_pdf(_as_source(pdf)) as doc:
+        page_count = doc.page_count
+
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        workers = 1
+
+    pages = []
+    for chunk in _run_pdf_tasks(
+        _read_pages_worker, pdf, _page_ranges(page_count, workers), workers
+    ):
+        pages.extend(chunk)
+
+    return pages
+
+
+def extract_pages_text(pdf, workers: int = None) -> list:
+    """
+    Текст каждой страницы через MuPDF, в порядке страниц.
+    """
+    return [text for text, _ in read_pdf_pages(pdf, workers)]
+
+
+def ocr_pages(pdf, page_numbers: list, workers: int = None,
+              dpi: int = OCR_DPI) -> dict:
+    """
+    Растеризует и распознаёт только указанные страницы в пуле процессов.
+    Возвращает {номер страницы: текст}.
+    """
+    workers = _resolve_workers(workers)
+    tasks = [
+        (page_numbers[i:i + OCR_PAGES_PER_TASK], dpi)
+        for i in range(0, len(page_numbers), OCR_PAGES_PER_TASK)
+    ]
+
+    result = {}
+    for (numbers, _dpi), texts in zip(tasks, _run_pdf_tasks(_ocr_pages_worker, pdf, tasks, workers)):
+        result.update(zip(numbers, texts))
+
+    return result
+
+
+def file_sha256(path) -> str:
+    """
+    SHA-256 файла через mmap: страницы файла читает ядро,
+    без копии содержимого в памяти процесса.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256(b"").hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def _pdf_sha256(pdf) -> str:
+    if _is_path(pdf):
+        return file_sha256(pdf)
+    return hashlib.sha256(pdf).hexdigest()
+
+
+def _extraction_cache_key(pdf) -> str:
+    return make_key(
+        "pdf-text",
+        _pdf_sha256(pdf),
+        {
+            "version": EXTRACTOR_VERSION,
+            "ocr_page_min_chars": OCR_PAGE_MIN_CHARS,
+            "ocr_dpi": OCR_DPI,
+            "ocr_grayscale": OCR_GRAYSCALE,
+            "ocr_lang": OCR_LANG,
+        }
+    )
+
+
+def extract_text_from_pdf_file(uploaded_file, workers: int = None):
+    """
+    1) Извлекает текст каждой страницы через MuPDF.
+    2) Страницы-сканы (без текстового слоя, с изображениями) распознаёт
+       через OCR (Tesseract) в пуле процессов и вставляет на их места.
+
+    Результат кэшируется на диске по SHA-256 содержимого и настройкам
+    извлечения, поэтому повторная загрузка того же файла мгновенна.
+
+    uploaded_file — файловый объект (например, загрузка Streamlit) или путь
+    к файлу. Путь не читается в память целиком: MuPDF и воркеры открывают
+    файл сами, хэш считается через mmap, OCR растеризует прямо из файла.
+
+    workers — число процессов для страниц (None — PDF_WORKERS, 1 — без пула).
+
+    Возвращает TextDocument — строку со страницами и индексами строк.
+    """
+    if _is_path(uploaded_file):
+        pdf = os.fspath(uploaded_file)
+    else:
+        uploaded_file.seek(0)
+        pdf = uploaded_file.read()
+
+    if not EXTRACTION_CACHE_ENABLED:
+        pages, _complete = _extract_pages_with_ocr(pdf, workers)
+        return TextDocument(pages)
+
+    key = _extraction_cache_key(pdf)
+
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return TextDocument(json.loads(cached))
+
+    pages, complete = _extract_pages_with_ocr(pdf, workers)
+    document = TextDocument(pages)
+
+    # Неполный результат (OCR части страниц не удался) не кэшируется,
+    # чтобы следующая загрузка повторила распознавание.
+    if complete:
+        extraction_cache.set(key, json.dumps(document.pages, ensure_ascii=False))
+
+    return document
+
+
+def _extract_pages_with_ocr(pdf, workers: int = None) -> tuple:
+    """
+    Текст документа по страницам (MuPDF + OCR страниц-сканов) и флаг
+    полноты: False, если OCR хотя бы части страниц завершился ошибкой.
+    Если MuPDF не открыл документ, список состоит из одного сообщения
+    "OCR error: ...": растеризовать такой документ тоже нечем.
+    """
     try:
-        images = convert_from_bytes(pdf_bytes)
-        for img in images:
-            ocr_text += pytesseract.image_to_string(img, lang="rus+eng") + "\n"
+        pages = read_pdf_pages(pdf, workers)
     except Exception as e:
-        return f"OCR error: {e}"
+        return [f"OCR error: {e}"], False
+
+    texts = [text for text, _ in pages]
+    ocr_needed = [i for i, (_, needs_ocr) in enumerate(pages) if needs_ocr]
+
+    if not ocr_needed and len("".join(texts).strip()) <= 50:
+        ocr_needed = list(range(len(pages)))
+
+    if ocr_needed:
+        try:
+            for i, text in ocr_pages(pdf, ocr_needed, workers).items():
+                texts[i] = text + "\n"
+        except Exception as e:
+            if len("".join(texts).strip()) <= 50:
+                return [f"OCR error: {e}"], False
+            return texts, False
 
-    return ocr_text
+    return texts, True
+
+
+# Граница описания — следующий код компетенции или начало раздела IV.
+# Учитываются OCR-варианты: пробелы вокруг дефиса, разные тире и латинские
+# двойники кириллических букв (Y/У, K/К, O/0/О).
+COMPETENCY_BOUNDARY_RE = re.compile(
+    r"(?<![A-Za-zА-Яа-яЁё])"
+    r"(?P<prefix>[УY][КK]|[ОO0]П[КK]|П[КK])"
+    r"\s*[-‐‑–—]\s*(?P<num>\d{1,3})(?!\d)"
+    r"|(?P<end>IV\.\s*Требования\s+к\s+условиям\s+реализации\s+программы)"
+)
+
+_COMPETENCY_PREFIXES = {
+    "УК": "УК", "YК": "УК", "УK": "УК", "YK": "УК",
+    "ПК": "ПК", "ПK": "ПК",
+}
+
+
+def _normalize_competency_prefix(prefix: str) -> str:
+    if prefix in _COMPETENCY_PREFIXES:
+        return _COMPETENCY_PREFIXES[prefix]
+    return "ОПК"
 
 
 def extract_competencies_full(text):
     """
     Извлекает УК, ОПК, ПК из текста ФГОС.
+
+    Один проход по тексту: находятся позиции всех кодов (и границы
+    раздела IV), описание — срез между соседними границами.
+    Повторы кода (оглавление, ссылки в таблицах) схлопываются:
+    остаётся первое вхождение с самым полным описанием.
     """
-    pattern = (
-        r"(УК-\d+|ОПК-\d+|ПК-\d+)\.?\s*(.*?)\s*"
-        r"(?=(УК-\d+|ОПК-\d+|ПК-\d+|IV\. Требования к условиям реализации программы бакалавриата|$))"
-    )
-    matches = re.findall(pattern, text, re.DOTALL)
+    text = text or ""
+    boundaries = list(COMPETENCY_BOUNDARY_RE.finditer(text))
+
+    # code -> (start, end) самого длинного фрагмента; тексты
+    # нормализуются один раз в конце, а не для каждого вхождения.
+    spans = {}
+
+    for i, match in enumerate(boundaries):
+        if match.group("end"):
+            continue
+
+        code = f"{_normalize_competency_prefix(match.group('prefix'))}-{match.group('num')}"
+        start = match.end()
+        end = boundaries[i + 1].start() if i + 1 < len(boundaries) else len(text)
+
+        current = spans.get(code)
+        if current is None or end - start > current[1] - current[0]:
+            spans[code] = (start, end)
 
     competencies = []
-    for code, desc, _ in matches:
-        desc = " ".join(desc.split())
-        competencies.append({"code": code, "description": desc})
+    for code, (start, end) in spans.items():
+        desc = text[start:end]
+        if desc.startswith("."):
+            desc = desc[1:]
+        competencies.append({"code": code, "description": " ".join(desc.split())})
+
     return competencies
 
 
-def detect_profile_from_fgos(fgos_text: str):
-    from ai import call_yandex_lite
-    import json
+DIRECTION_CODE_RE = re.compile(r"(?<![\d.])(\d{2}\.0[3-9]\.\d{2})(?![\d.])")
+
+FGOS_ORDER_RE = re.compile(
+    r"от\s+(\d{1,2})\s+([а-яё]+)\s+(\d{4})\s*г?\.?\s*(?:N|№)\s*(\d+)",
+    re.IGNORECASE
+)
+
+
+def detect_direction_code(fgos_text: str):
+    """
+    Код направления подготовки (например, 09.03.01) — первый в тексте ФГОС.
+    """
+    match = DIRECTION_CODE_RE.search((fgos_text or "")[:20000])
+    return match.group(1) if match else None
+
+
+def detect_fgos_version(fgos_text: str):
+    """
+    Версия ФГОС по реквизитам утверждающего приказа: «от 19 сентября 2017 г. № 929».
+    """
+    match = FGOS_ORDER_RE.search((fgos_text or "")[:20000])
+    if not match:
+        return None
+
+    day, month, year, number = match.groups()
+    return f"{int(day)} {month.lower()} {year} № {number}"
+
+
+def detect_fgos_title(fgos_text: str, direction_code: str) -> str:
+    match = re.search(
+        re.escape(direction_code) + r"\s*[«\"]?\s*([А-ЯЁA-Zа-яё][^\n«»\"]{2,150})",
+        (fgos_text or "")[:20000]
+    )
+    return " ".join(match.group(1).split()).strip(" .,;") if match else ""
+
+
+def detect_profile_from_fgos(fgos_text: str, min_confidence: float = PROFILE_MIN_CONFIDENCE):
+    """
+    Определяет профиль подготовки по ФГОС.
+    Сначала локальный классификатор (коды направлений и ключевые слова);
+    модель вызывается только при низкой уверенности.
+    """
+    from plan import classify_profile, PROFILE_TITLES
+
+    profile, confidence = classify_profile(fgos_text)
+    local_profiles = [PROFILE_TITLES.get(profile, profile)] if profile else []
+
+    if local_profiles and confidence >= min_confidence:
+        return local_profiles
 
     raw_profiles = ""  # ← ВАЖНО
 
@@ -76,14 +490,16 @@ def detect_profile_from_fgos(fgos_text: str):
         raw_profiles = call_yandex_lite(
             [{"role": "user", "text": prompt}],
             temperature=0.1,
-            max_tokens=500
+            max_tokens=500,
+            caller="detect_profile_from_fgos",
+            validate=is_json_answer
         )
 
         start = raw_profiles.index("{")
         end = raw_profiles.rindex("}") + 1
         data = json.loads(raw_profiles[start:end])
 
-        return data.get("profiles", [])
+        return data.get("profiles", []) or local_profiles
 
-    except Exception as e:
-        return []  # ← не падаем вообще
\ No newline at end of file
+    except Exception:
+        return local_profiles  # ← не падаем вообще
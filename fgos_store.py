@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+from cache import DATA_DIR, open_sqlite
+from document import TextDocument
+
+FGOS_STORE_PATH = os.getenv("FGOS_STORE_PATH", os.path.join(DATA_DIR, "fgos_store.sqlite3"))
+
+
+class FgosStore:
+    """
+    Компактное хранилище компетенций ФГОС на SQLite.
+
+    Ключ — (код направления, версия ФГОС). Компетенции хранятся
+    компактным JSON, текст стандарта — сжатым zlib, чтобы план можно было
+    сгенерировать без повторной загрузки и разбора PDF.
+    """
+
+    def __init__(self, path: str = FGOS_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = open_sqlite(self.path, """
+                CREATE TABLE IF NOT EXISTS fgos (
+                    direction_code TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    competencies TEXT NOT NULL,
+                    competencies_count INTEGER NOT NULL,
+                    text BLOB NOT NULL,
+                    ingested REAL NOT NULL,
+                    PRIMARY KEY (direction_code, version)
+                );
+            """)
+        return self._conn
+
+    def save(self, record: dict) -> None:
+        pairs = [[c["code"], c["description"]] for c in record.get("competencies", [])]
+        competencies = json.dumps(
+            pairs,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        text = zlib.compress(str(record.get("text", "")).encode("utf-8"), 6)
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO fgos "
+                "(direction_code, version, title, source, sha256, competencies, "
+                "competencies_count, text, ingested) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["direction_code"],
+                    record["version"],
+                    record.get("title", ""),
+                    record.get("source", ""),
+                    record.get("sha256", ""),
+                    competencies,
+                    len(pairs),
+                    text,
+                    time.time(),
+                )
+            )
+            conn.commit()
+
+    def list_standards(self) -> list:
+        """
+        Краткий список без текстов: код, версия, название, число компетенций.
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT direction_code, version, title, competencies_count FROM fgos "
+                "ORDER BY direction_code, version"
+            ).fetchall()
+
+        return [
+            {
+                "direction_code": code,
+                "version": version,
+                "title": title,
+                "competencies_count": count,
+            }
+            for code, version, title, count in rows
+        ]
+
+    def load(self, direction_code: str, version: str):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT title, source, sha256, competencies, text FROM fgos "
+                "WHERE direction_code = ? AND version = ?",
+                (direction_code, version)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        title, source, sha256, competencies, text = row
+
+        return {
+            "direction_code": direction_code,
+            "version": version,
+            "title": title,
+            "source": source,
+            "sha256": sha256,
+            "competencies": [
+                {"code": code, "description": description}
+                for code, description in json.loads(competencies)
+            ],
+            "text": TextDocument(zlib.decompress(text).decode("utf-8")),
+        }
@@ -0,0 +1,103 @@
+"""
+Пакетная загрузка ФГОС в библиотеку компетенций.
+
+Извлекает текст и компетенции из всех PDF/TXT в каталоге (в пуле
+процессов) и сохраняет их в fgos_store по коду направления и версии ФГОС.
+После этого стандарт выбирается в приложении из библиотеки без загрузки PDF.
+
+Запуск:
+    python ingest_fgos.py path/to/fgos_dir --workers 8
+"""
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import fgos
+from fgos_store import FgosStore, FGOS_STORE_PATH
+
+
+def ingest_file(path: str) -> dict:
+    if path.lower().endswith(".pdf"):
+        # Параллельность уже на уровне файлов — страницы документа
+        # внутри воркера обрабатываются без собственного пула процессов.
+        text = fgos.extract_text_from_pdf_file(path, workers=1)
+    else:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8", errors="ignore")
+
+    if text.startswith("OCR error") or len(text.strip()) < 50:
+        raise ValueError("не удалось извлечь текст")
+
+    direction_code = fgos.detect_direction_code(text)
+    if not direction_code:
+        raise ValueError("не найден код направления")
+
+    sha256 = fgos.file_sha256(path)
+
+    return {
+        "direction_code": direction_code,
+        "version": fgos.detect_fgos_version(text) or f"sha256:{sha256[:12]}",
+        "title": fgos.detect_fgos_title(text, direction_code),
+        "source": os.path.basename(path),
+        "sha256": sha256,
+        "competencies": fgos.extract_competencies_full(text),
+        "text": str(text),
+    }
+
+
+def find_documents(root: str, recursive: bool) -> list:
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.lower().endswith((".pdf", ".txt")):
+                paths.append(os.path.join(dirpath, name))
+        if not recursive:
+            break
+    return paths
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетная загрузка ФГОС в библиотеку компетенций")
+    parser.add_argument("directory", help="каталог с PDF/TXT файлами ФГОС")
+    parser.add_argument("--store", default=FGOS_STORE_PATH, help="путь к SQLite-хранилищу")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--recursive", action="store_true", help="обходить подкаталоги")
+    args = parser.parse_args(argv)
+
+    paths = find_documents(args.directory, args.recursive)
+    if not paths:
+        print("Файлы ФГОС не найдены.", file=sys.stderr)
+        return 1
+
+    store = FgosStore(args.store)
+    failed = 0
+
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.workers, len(paths))),
+        mp_context=get_context("spawn")
+    ) as pool:
+        futures = {pool.submit(ingest_file, path): path for path in paths}
+
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[ошибка] {path}: {e}", file=sys.stderr)
+                continue
+
+            store.save(record)
+            print(
+                f"[ok] {record['direction_code']} ({record['version']}): "
+                f"{len(record['competencies'])} компетенций — {path}"
+            )
+
+    print(f"Загружено: {len(paths) - failed}, с ошибками: {failed}. Хранилище: {args.store}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
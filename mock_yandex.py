@@ -0,0 +1,294 @@
+"""
+Локальная заглушка Yandex Foundation Models для офлайн-нагрузочного
+тестирования и замеров задержек.
+
+Реализует POST /foundationModels/v1/completion в том же формате, что
+использует ai.post_to_yandex (включая stream=True), и отвечает
+шаблонным JSON для каждого семейства промптов проекта.
+
+Запуск:
+    python mock_yandex.py --port 8765 --latency-ms 800 --jitter-ms 300 --error-rate 0.05
+
+Приложение направляется на заглушку переменными окружения:
+    YANDEX_COMPLETION_URL=http://127.0.0.1:8765/foundationModels/v1/completion
+    YANDEX_API_KEY=local
+"""
+import re
+import json
+import time
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION_PATH = "/foundationModels/v1/completion"
+
+FUNDAMENTAL = [
+    "Математический анализ", "Линейная алгебра", "Дискретная математика",
+    "Теория вероятностей и математическая статистика", "Физика",
+    "Программирование", "Алгоритмы и структуры данных", "Базы данных",
+    "Операционные системы", "Компьютерные сети",
+    "Архитектура вычислительных систем", "Иностранный язык",
+]
+
+VARIATIVE = [
+    "Веб-разработка", "Машинное обучение", "Анализ данных",
+    "Проектирование информационных систем", "Информационная безопасность",
+    "Облачные технологии", "Разработка мобильных приложений",
+    "Тестирование программного обеспечения", "DevOps-практики",
+    "Компьютерная графика", "Параллельное программирование",
+    "Распределённые системы", "Системное администрирование",
+    "Управление IT-проектами", "Технологии NoSQL",
+]
+
+
+def _codes(pattern, text, limit):
+    found = []
+    for code in re.findall(pattern, text):
+        if code not in found:
+            found.append(code)
+    return found[:limit]
+
+
+def _disciplines(prompt):
+    return {
+        "fundamental": [{"name": x} for x in FUNDAMENTAL],
+        "variative": [{"name": x} for x in VARIATIVE],
+    }
+
+
+def _enrichment(prompt):
+    competencies = _codes(r"(?:УК|ОПК|ПК)-\d+", prompt, 3)
+    tf = _codes(r"[A-ZА-Я]/\d{2}\.\d", prompt, 2)
+    return {
+        "competencies": competencies,
+        "TF": tf,
+        "reason": "Дисциплина формирует профильные компетенции (ответ заглушки).",
+    }
+
+
+def _enrichment_batch(prompt):
+    listed = prompt.split("Дисциплины:", 1)[-1].split("ЗАДАЧА", 1)[0]
+    names = re.findall(r"^\d+\.\s+(.+)$", listed, re.MULTILINE)
+    return {name.strip(): _enrichment(prompt) for name in names}
+
+
+def _tf_analysis(prompt):
+    code = (_codes(r"[A-ZА-Я]/\d{2}\.\d", prompt, 1) or ["A/01.1"])[0]
+    return {
+        "name": f"Трудовая функция {code}",
+        "actions": ["Анализ требований", "Разработка решений"],
+        "knowledge": ["Методы проектирования"],
+        "skills": ["Применять инструменты разработки"],
+        "other": [],
+    }
+
+
+def _tf_batch(prompt):
+    listed = prompt.split("Коды:", 1)[-1].split("Извлеки", 1)[0]
+    codes = re.findall(r"^([A-ZА-Я]/\d{2}\.\d)$", listed, re.MULTILINE)
+    return {code: _tf_analysis(code) for code in codes}
+
+
+def _tf_codes(prompt):
+    return {"codes": _codes(r"[A-ZА-Я]/\d{2}\.\d", prompt, 40)}
+
+
+def _matching(prompt):
+    competencies = _codes(r"(?:УК|ОПК|ПК)-\d+", prompt, 10)
+    tf = _codes(r"[A-ZА-Я]/\d{2}\.\d", prompt, 10)
+    return {
+        "matches": [
+            {"competency": c, "related_TF": tf[:1], "comment": "Ответ заглушки"}
+            for c in competencies
+        ],
+        "gaps": [],
+        "recommendations": ["Ответ локальной заглушки."],
+    }
+
+
+def _profile(prompt):
+    return {"profiles": ["Информатика и вычислительная техника"]}
+
+
+def _edit_command(prompt):
+    return {"action": "error", "value": "Локальная заглушка не редактирует план."}
+
+
+def _work_program(prompt):
+    name = re.search(r"- Дисциплина: (.+)", prompt)
+    name = name.group(1).strip() if name else "Дисциплина"
+    topics = [f"Тема {i}. Раздел дисциплины {i}" for i in range(1, 9)]
+    return {
+        "title": "Рабочая программа дисциплины",
+        "discipline_code": "Б1.О.01",
+        "discipline_name": name,
+        "goals": "Цель дисциплины — сформировать профессиональные компетенции.",
+        "place_in_program": "Дисциплина относится к обязательной части программы.",
+        "results": [{
+            "code": "УК-1", "competence": "Системное мышление",
+            "indicator": "УК-1.1", "know": "Методы анализа",
+            "able": "Анализировать задачи", "master": "Навыками анализа",
+        }],
+        "total_credits": 3,
+        "total_hours": 108,
+        "structure_rows": [{
+            "section": "Раздел 1", "topic": t, "semester": 1, "weeks": "1-2",
+            "lectures": 2, "labs": 2, "other_contact": 0, "self_study": 6,
+            "current_control": "Опрос", "intermediate_control": "зачёт",
+        } for t in topics[:6]],
+        "lecture_topics": topics,
+        "lab_topics": [{"name": f"Практическое занятие {i}", "hours": 2} for i in range(1, 5)],
+        "education_technologies": ["Проблемное обучение"],
+        "self_study_rows": [{
+            "weeks": "1-2", "topic": t, "kind": "Подготовка к занятиям",
+            "task": "Изучить материал", "literature": "1-3", "hours": 6,
+        } for t in topics[:4]],
+        "assessment_tools": ["Опрос", "зачёт"],
+        "literature": [f"{i}. Учебник {i}" for i in range(1, 6)],
+        "software": ["LibreOffice"],
+        "equipment": ["Компьютерный класс"],
+    }
+
+
+# (маркер в тексте промпта, генератор ответа); первый совпавший побеждает.
+PROMPT_FAMILIES = [
+    ("Сгенерируй учебные дисциплины", _disciplines),
+    ("по каждой дисциплине из списка", _enrichment_batch),
+    ("Выбери 2-4 компетенции ФГОС", _enrichment),
+    ("найди все коды трудовых функций", _tf_codes),
+    ("по каждому коду из списка", _tf_batch),
+    ("относящийся к трудовой функции", _tf_analysis),
+    ("сопоставить компетенции и трудовые функции", _matching),
+    ("рабочую программу дисциплины", _work_program),
+    ("Определи профиль подготовки", _profile),
+    ("система редактирования учебного плана", _edit_command),
+]
+
+
+def answer_for(messages) -> str:
+    prompt = "\n".join(str(m.get("text", "")) for m in messages)
+
+    for marker, build in PROMPT_FAMILIES:
+        if marker in prompt:
+            return json.dumps(build(prompt), ensure_ascii=False)
+
+    return "Это ответ локальной заглушки методиста. Рекомендую проверить баланс часов по семестрам."
+
+
+def _completion(text, input_tokens, status="ALTERNATIVE_STATUS_FINAL"):
+    return {
+        "result": {
+            "alternatives": [{
+                "message": {"role": "assistant", "text": text},
+                "status": status,
+            }],
+            "usage": {
+                "inputTextTokens": str(input_tokens),
+                "completionTokens": str(max(1, len(text) // 4)),
+                "totalTokens": str(input_tokens + max(1, len(text) // 4)),
+            },
+            "modelVersion": "mock",
+        }
+    }
+
+
+class MockYandexHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        raw = self.rfile.read(length)
+
+        if self.path != COMPLETION_PATH:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            data = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "bad json"})
+            return
+
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if random.random() < self.error_rate:
+            if random.random() < 0.5:
+                self._send_json(429, {"error": "rate limit"}, {"Retry-After": "1"})
+            else:
+                self._send_json(503, {"error": "unavailable"})
+            return
+
+        messages = data.get("messages", [])
+        text = answer_for(messages)
+        input_tokens = sum(len(str(m.get("text", ""))) for m in messages) // 4
+        options = data.get("completionOptions", {})
+
+        if not options.get("stream"):
+            self._send_json(200, _completion(text, input_tokens))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        step = max(1, len(text) // 10)
+        for end in range(step, len(text) + step, step):
+            status = "ALTERNATIVE_STATUS_FINAL" if end >= len(text) else "ALTERNATIVE_STATUS_PARTIAL"
+            line = json.dumps(_completion(text[:end], input_tokens, status), ensure_ascii=False) + "\n"
+            chunk = line.encode("utf-8")
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            time.sleep(delay / 10)
+
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(host="127.0.0.1", port=8765, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+    handler = type("ConfiguredMockYandexHandler", (MockYandexHandler,), {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Yandex completion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="средняя задержка ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="стандартное отклонение задержки")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429/503")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"YANDEX_COMPLETION_URL=http://{args.host}:{args.port}{COMPLETION_PATH}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
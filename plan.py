@@ -1,8 +1,11 @@
+import re
+
 import pandas as pd
 
 from disciplines import generate_disciplines
-from ai import enrich_discipline_metadata
-from competencies import detect_competencies
+from ai import enrich_disciplines_batch
+from competencies import detect_competencies, PROFILE_MAP
+from document import lowered
 
 
 def remove_duplicates(discs):
@@ -28,7 +31,7 @@ def detect_profile_by_code(fgos_text: str):
     Самый надёжный способ определить профиль — по коду направления.
     Это исправляет ошибку, когда любое слово 'образование' давало профиль 'Педагогика'.
     """
-    text = (fgos_text or "").lower()
+    text = lowered(fgos_text)
 
     if "09.03.01" in text or "09.04.01" in text:
         return "ИВТ"
@@ -63,89 +66,164 @@ def detect_profile_by_code(fgos_text: str):
     return None
 
 
+PROFILE_KEYWORDS = {
+    "ИВТ": [
+        "информатика и вычислительная техника",
+        "вычислительная техника",
+        "программное обеспечение",
+        "информационные системы",
+        "алгоритмы",
+        "программирование",
+        "информационно-коммуникационные технологии"
+    ],
+    "Прикладные математика и физика": [
+        "прикладные математика и физика",
+        "математическое моделирование",
+        "прикладная физика",
+        "физико-математический",
+        "численные методы",
+        "дифференциальные уравнения"
+    ],
+    "Живопись": [
+        "живопись",
+        "изобразительное искусство",
+        "художественная деятельность",
+        "академический рисунок",
+        "академическая живопись",
+        "композиция",
+        "реставрация"
+    ],
+    "История искусств": [
+        "история искусств",
+        "искусствоведение",
+        "музейная деятельность",
+        "культурно-просветительская деятельность"
+    ],
+    "Педагогика": [
+        "педагогическое образование",
+        "педагогическая деятельность",
+        "учитель",
+        "педагогический профиль"
+    ],
+    "Экономика": [
+        "экономика",
+        "экономическая деятельность",
+        "финансы",
+        "бухгалтерский учет"
+    ],
+    "Юриспруденция": [
+        "юриспруденция",
+        "правовое обеспечение",
+        "правоохранительная деятельность",
+        "гражданское право",
+        "уголовное право"
+    ],
+    "Психология": [
+        "психология",
+        "психологическая деятельность",
+        "психодиагностика"
+    ],
+    "Менеджмент": [
+        "менеджмент",
+        "управление персоналом",
+        "управленческая деятельность"
+    ],
+    "Дизайн": [
+        "дизайн",
+        "графический дизайн",
+        "проектная художественная деятельность"
+    ],
+}
+
+# Полные названия профилей для отображения и промптов.
+PROFILE_TITLES = {
+    "ИВТ": "Информатика и вычислительная техника",
+    "Прикладные математика и физика": "Прикладные математика и физика",
+    "Живопись": "Живопись",
+    "История искусств": "История искусств",
+    "Педагогика": "Педагогическое образование",
+    "Экономика": "Экономика",
+    "Юриспруденция": "Юриспруденция",
+    "Психология": "Психология",
+    "Менеджмент": "Менеджмент",
+    "Дизайн": "Дизайн",
+    "Социология": "Социология",
+    "Журналистика": "Журналистика",
+    "Лингвистика": "Лингвистика",
+}
+
+# Слова из PROFILE_MAP, которые встречаются в любом ФГОС и сами по себе
+# профиль не определяют (например, «образование» — не признак педагогики).
+WEAK_PROFILE_MARKERS = {"образование", "управление", "право", "перевод", "программирование"}
+
+DIRECTION_CODE_RE = re.compile(r"\b\d{2}\.\d{2}\.\d{2}\b")
+
+
+def classify_profile(fgos_text):
+    """
+    Локальное определение профиля без обращения к модели.
+
+    Возвращает (профиль, уверенность 0..1):
+    - код направления из detect_profile_by_code или PROFILE_MAP — 0.9+;
+    - иначе взвешенные ключевые слова (PROFILE_KEYWORDS и PROFILE_MAP),
+      уверенность растёт с отрывом лидера и числом совпавших признаков.
+    """
+    by_code = detect_profile_by_code(fgos_text)
+    if by_code:
+        return by_code, 0.95
+
+    text_lower = lowered(fgos_text)
+
+    codes = [
+        (text_lower.find(key), profile)
+        for key, profile in PROFILE_MAP.items()
+        if DIRECTION_CODE_RE.fullmatch(key) and key in text_lower
+    ]
+    if codes:
+        return min(codes)[1], 0.9
+
+    scores = {}
+
+    for profile_name, keywords in PROFILE_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                weight = 2.0 if " " in keyword else 1.0
+                scores[profile_name] = scores.get(profile_name, 0.0) + weight
+
+    for keyword, profile_name in PROFILE_MAP.items():
+        if DIRECTION_CODE_RE.fullmatch(keyword) or keyword not in text_lower:
+            continue
+        weight = 0.25 if keyword in WEAK_PROFILE_MARKERS else 1.0
+        scores[profile_name] = scores.get(profile_name, 0.0) + weight
+
+    if not scores:
+        return None, 0.0
+
+    ranked = sorted(scores.values(), reverse=True)
+    top = ranked[0]
+    second = ranked[1] if len(ranked) > 1 else 0.0
+
+    best = max(scores.items(), key=lambda x: x[1])[0]
+    margin = (top - second) / top
+    strength = min(1.0, top / 5)
+
+    return best, round(min(0.85, 0.5 * margin + 0.4 * strength), 2)
+
+
 def detect_profile_advanced(fgos_text, detected_profiles=None):
     """
     Резервное определение профиля, если код направления не найден.
     Важно: слово 'образование' НЕ используется как самостоятельный маркер педагогики.
     """
-    text_lower = (fgos_text or "").lower()
+    text_lower = lowered(fgos_text)
 
-    by_code = detect_profile_by_code(text_lower)
+    by_code = detect_profile_by_code(fgos_text)
     if by_code:
         return by_code
 
-    profile_keywords = {
-        "ИВТ": [
-            "информатика и вычислительная техника",
-            "вычислительная техника",
-            "программное обеспечение",
-            "информационные системы",
-            "алгоритмы",
-            "программирование",
-            "информационно-коммуникационные технологии"
-        ],
-        "Прикладные математика и физика": [
-            "прикладные математика и физика",
-            "математическое моделирование",
-            "прикладная физика",
-            "физико-математический",
-            "численные методы",
-            "дифференциальные уравнения"
-        ],
-        "Живопись": [
-            "живопись",
-            "изобразительное искусство",
-            "художественная деятельность",
-            "академический рисунок",
-            "академическая живопись",
-            "композиция",
-            "реставрация"
-        ],
-        "История искусств": [
-            "история искусств",
-            "искусствоведение",
-            "музейная деятельность",
-            "культурно-просветительская деятельность"
-        ],
-        "Педагогика": [
-            "педагогическое образование",
-            "педагогическая деятельность",
-            "учитель",
-            "педагогический профиль"
-        ],
-        "Экономика": [
-            "экономика",
-            "экономическая деятельность",
-            "финансы",
-            "бухгалтерский учет"
-        ],
-        "Юриспруденция": [
-            "юриспруденция",
-            "правовое обеспечение",
-            "правоохранительная деятельность",
-            "гражданское право",
-            "уголовное право"
-        ],
-        "Психология": [
-            "психология",
-            "психологическая деятельность",
-            "психодиагностика"
-        ],
-        "Менеджмент": [
-            "менеджмент",
-            "управление персоналом",
-            "управленческая деятельность"
-        ],
-        "Дизайн": [
-            "дизайн",
-            "графический дизайн",
-            "проектная художественная деятельность"
-        ],
-    }
-
     scores = {}
 
-    for profile_name, keywords in profile_keywords.items():
+    for profile_name, keywords in PROFILE_KEYWORDS.items():
         score = sum(1 for keyword in keywords if keyword in text_lower)
         if score > 0:
             scores[profile_name] = score
@@ -218,7 +296,7 @@ def balanced_distribution(obligatory, variative, level="bachelor"):
 
 
 def detect_level(fgos_text: str, profile: str = ""):
-    text = (fgos_text or "").lower()
+    text = lowered(fgos_text)
     p = (profile or "").lower()
 
     if "54.05.02" in text or "специалитет" in text or "специалист" in p:
@@ -481,16 +559,13 @@ def generate_plan_pipeline(df_fgos, tf_struct, match_json, fgos_text):
 
     discs = remove_duplicates(discs)
 
-    enriched = {}
-
-    for d in discs:
-        enriched[d["name"]] = enrich_discipline_metadata(
-            d,
-            df_fgos,
-            tf_struct,
-            profile,
-            fgos_text
-        )
+    enriched = enrich_disciplines_batch(
+        discs,
+        df_fgos,
+        tf_struct,
+        profile,
+        fgos_text
+    )
 
     obligatory = [
         d for d in discs
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+from cache import DATA_DIR, open_sqlite
+
+PROF_LIBRARY_PATH = os.getenv("PROF_LIBRARY_PATH", os.path.join(DATA_DIR, "prof_library.sqlite3"))
+
+
+def document_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ProfLibrary:
+    """
+    Библиотека разобранных профстандартов на SQLite.
+
+    Ключ — SHA-256 исходного файла: повторная загрузка того же документа
+    не требует нового analyze_prof_standard. Редакции одного стандарта
+    (один регистрационный номер, разные файлы) нумеруются версиями.
+    Структура {"TF": [...]} хранится сжатым zlib JSON.
+    """
+
+    def __init__(self, path: str = PROF_LIBRARY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = open_sqlite(self.path, """
+                CREATE TABLE IF NOT EXISTS profstandards (
+                    sha256 TEXT PRIMARY KEY,
+                    reg_number TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    tf_count INTEGER NOT NULL,
+                    tf_struct BLOB NOT NULL,
+                    saved REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS profstandards_reg ON profstandards(reg_number, version);
+            """)
+        return self._conn
+
+    def save(self, sha256: str, tf_struct: dict, reg_number: str = "", title: str = "",
+             source: str = "") -> int:
+        """
+        Сохраняет разбор документа и возвращает номер его версии.
+        Новый файл с уже известным регистрационным номером получает
+        следующую версию; тот же файл перезаписывает свою.
+        """
+        payload = zlib.compress(
+            json.dumps(tf_struct, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6
+        )
+        reg_number = reg_number or ""
+
+        with self._lock:
+            conn = self._connect()
+
+            row = conn.execute(
+                "SELECT version FROM profstandards WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+
+            if row is not None:
+                version = row[0]
+            elif reg_number:
+                version = conn.execute(
+                    "SELECT COALESCE(MAX(version), 0) + 1 FROM profstandards WHERE reg_number = ?",
+                    (reg_number,)
+                ).fetchone()[0]
+            else:
+                version = 1
+
+            conn.execute(
+                "INSERT OR REPLACE INTO profstandards "
+                "(sha256, reg_number, version, title, source, tf_count, tf_struct, saved) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    sha256,
+                    reg_number,
+                    version,
+                    title or "",
+                    source or "",
+                    len(tf_struct.get("TF", [])),
+                    payload,
+                    time.time(),
+                )
+            )
+            conn.commit()
+
+        return version
+
+    def get_by_hash(self, sha256: str):
+        """
+        Разобранная структура {"TF": [...]} по хэшу файла или None.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT tf_struct FROM profstandards WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def get(self, reg_number: str, version: int = None):
+        """
+        Структура по регистрационному номеру; без version — последняя редакция.
+        """
+        with self._lock:
+            if version is None:
+                row = self._connect().execute(
+                    "SELECT sha256 FROM profstandards WHERE reg_number = ? "
+                    "ORDER BY version DESC LIMIT 1",
+                    (reg_number,)
+                ).fetchone()
+            else:
+                row = self._connect().execute(
+                    "SELECT sha256 FROM profstandards WHERE reg_number = ? AND version = ?",
+                    (reg_number, version)
+                ).fetchone()
+
+        return self.get_by_hash(row[0]) if row else None
+
+    def list_standards(self) -> list:
+        """
+        Краткий список без структур: номер, версия, название, число ТФ, хэш.
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT sha256, reg_number, version, title, source, tf_count FROM profstandards "
+                "ORDER BY reg_number, version DESC"
+            ).fetchall()
+
+        return [
+            {
+                "sha256": sha256,
+                "reg_number": reg_number,
+                "version": version,
+                "title": title,
+                "source": source,
+                "tf_count": tf_count,
+            }
+            for sha256, reg_number, version, title, source, tf_count in rows
+        ]
@@ -1,49 +1,62 @@
+import os
 import re
 import json
-from ai import call_yandex_lite
+from ai import AI_CONCURRENCY, call_yandex_lite, extract_json, is_json_answer, run_bounded
+from document import as_document, lowered, text_lines
+
+# Сколько трудовых функций анализируется одновременно и сколько секунд
+# ждать одну ТФ, прежде чем записать для неё пустой результат.
+TF_ANALYSIS_WORKERS = int(os.getenv("TF_ANALYSIS_WORKERS", str(AI_CONCURRENCY)))
+TF_ANALYSIS_TIMEOUT = float(os.getenv("TF_ANALYSIS_TIMEOUT", "180"))
+
+# Пакетный анализ: несколько блоков ТФ в одном запросе, пока оценка
+# размера промпта не превышает TF_BATCH_TOKENS.
+TF_BATCH_ENABLED = os.getenv("TF_BATCH", "1") != "0"
+TF_BATCH_TOKENS = int(os.getenv("TF_BATCH_TOKENS", "6000"))
+TF_BATCH_MAX_CODES = int(os.getenv("TF_BATCH_MAX_CODES", "8"))
+TF_CONTEXT_MAX_CHARS = 6000
+
+# Трудовые функции с типовой разметкой разбираются без обращения к модели.
+TF_RULE_PARSER_ENABLED = os.getenv("TF_RULE_PARSER", "1") != "0"
+
+# Все варианты записи кода ТФ за один проход: A/01.1, A-01.1, A/01/1, A – 01,1, A.01.1.
+# Группы: буква, номер (после / или -), номер (после точки), уровень.
+TF_CODE_RE = re.compile(
+    r"\b([A-ZА-Я])\s*"
+    r"(?:[/\-–—]\s*(\d{1,2})\s*[.\-–—,·/]|\.\s*(\d{1,2})\s*\.)"
+    r"\s*(\d{1,2})\b",
+    re.IGNORECASE
+)
+
+
+def scan_tf_codes(full_text) -> dict:
+    """
+    Коды трудовых функций в нормализованном виде (A/01.1) →
+    смещение первого вхождения. Порядок — порядок появления в тексте.
+    """
+    codes = {}
+    for match in TF_CODE_RE.finditer(full_text or ""):
+        letter, num_slash, num_dot, level = match.groups()
+        code = f"{letter.upper()}/{(num_slash or num_dot).zfill(2)}.{level}"
+        if code not in codes:
+            codes[code] = match.start()
+    return codes
+
 
-def extract_tf_codes_smart(full_text):
+def extract_tf_codes_smart(full_text, refresh=False):
     """
     Извлекает коды трудовых функций из текста профстандарта.
     Поддерживает различные форматы: A/01.1, A-01.1, A.01.1, A/01/1 и т.д.
     """
-    codes = []
-    
-    pattern1 = r"\b([A-ZА-Я])\s*[/\-–—]\s*(\d{1,2})\s*[\.\-–—,·]\s*(\d{1,2})\b"
-    matches1 = re.findall(pattern1, full_text, re.IGNORECASE)
-    for letter, num1, num2 in matches1:
-        code = f"{letter.upper()}/{num1.zfill(2)}.{num2}"
-        if code not in codes:
-            codes.append(code)
-    
-    pattern2 = r"\b([A-ZА-Я])\s*[/\-–—]\s*(\d{1,2})\s*[/\-–—]\s*(\d{1,2})\b"
-    matches2 = re.findall(pattern2, full_text, re.IGNORECASE)
-    for letter, num1, num2 in matches2:
-        code = f"{letter.upper()}/{num1.zfill(2)}.{num2}"
-        if code not in codes:
-            codes.append(code)
-    
-    pattern3 = r"\b([A-ZА-Я])\s*\.\s*(\d{1,2})\s*\.\s*(\d{1,2})\b"
-    matches3 = re.findall(pattern3, full_text, re.IGNORECASE)
-    for letter, num1, num2 in matches3:
-        code = f"{letter.upper()}/{num1.zfill(2)}.{num2}"
-        if code not in codes:
-            codes.append(code)
-    
-    pattern4 = r"(?:трудовая\s+функция|тф|функция)\s+([A-ZА-Я])\s*[/\-–—]\s*(\d{1,2})\s*[\.\-–—,·]\s*(\d{1,2})\b"
-    matches4 = re.findall(pattern4, full_text, re.IGNORECASE)
-    for letter, num1, num2 in matches4:
-        code = f"{letter.upper()}/{num1.zfill(2)}.{num2}"
-        if code not in codes:
-            codes.append(code)
-    
+    codes = list(scan_tf_codes(full_text))
+
     if not codes:
-        codes = extract_tf_codes_with_ai(full_text)
-    
+        codes = extract_tf_codes_with_ai(full_text, refresh)
+
     return codes
 
 
-def extract_tf_codes_with_ai(full_text):
+def extract_tf_codes_with_ai(full_text, refresh=False):
     """
     Альтернативный метод извлечения кодов через ИИ,
     если регулярные выражения не нашли коды.
@@ -69,7 +82,10 @@ def extract_tf_codes_with_ai(full_text):
         raw = call_yandex_lite(
             [{"role": "user", "text": prompt}],
             temperature=0.1,
-            max_tokens=500
+            max_tokens=500,
+            caller="extract_tf_codes_with_ai",
+            validate=is_json_answer,
+            refresh=refresh
         )
         
         start = raw.index("{")
@@ -92,15 +108,85 @@ def extract_tf_codes_with_ai(full_text):
     except Exception:
         return []
 
-def get_context_for_tf(full_text, tf_code, window=25):
-    lines = full_text.split("\n")
+# Заголовки раздела III: «3.1. Обобщенная трудовая функция», «3.1.2. Трудовая функция».
+TF_HEADER_RE = re.compile(
+    r"^[ \t]*3\.\d+(\.\d+)?\.?[ \t]*(?:Обобщ[её]нная\s+)?трудовая\s+функция",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Раздел IV закрывает последнюю трудовую функцию.
+TF_SECTION_END_RE = re.compile(r"^[ \t]*IV\.\s*Сведения", re.IGNORECASE | re.MULTILINE)
+
+
+def build_tf_index(full_text, window=25, offsets=None) -> dict:
+    """
+    Индекс «код ТФ → (start, end)» за один проход по тексту.
+
+    Раздел III делится на блоки по заголовкам трудовых функций; блок
+    заголовка «3.x.y. Трудовая функция» принадлежит первому коду внутри него.
+    Для кодов без своего блока (например, только в таблице раздела II)
+    берётся окно ±window строк вокруг первого вхождения.
+    offsets — уже готовый результат scan_tf_codes, чтобы не сканировать текст заново.
+    """
+    full_text = full_text or ""
+
+    headers = list(TF_HEADER_RE.finditer(full_text))
+    end_match = TF_SECTION_END_RE.search(full_text, headers[-1].end()) if headers else None
+    section_end = end_match.start() if end_match else len(full_text)
+
+    index = {}
+    for i, header in enumerate(headers):
+        if header.group(1) is None:
+            # Обобщенная трудовая функция — заголовок группы, а не ТФ.
+            continue
+
+        start = header.start()
+        end = headers[i + 1].start() if i + 1 < len(headers) else section_end
+
+        match = TF_CODE_RE.search(full_text, start, end)
+        if not match:
+            continue
+
+        letter, num_slash, num_dot, level = match.groups()
+        code = f"{letter.upper()}/{(num_slash or num_dot).zfill(2)}.{level}"
+        index.setdefault(code, (start, end))
+
+    document = None
+    if offsets is None:
+        offsets = scan_tf_codes(full_text)
+
+    for code, offset in offsets.items():
+        if code in index:
+            continue
+        if document is None:
+            document = as_document(full_text)
+        line = document.line_at(offset)
+        index[code] = document.line_span(line - window, line + window)
+
+    return index
+
+
+def get_context_for_tf(full_text, tf_code, window=25, index=None):
+    """
+    Фрагмент профстандарта, относящийся к трудовой функции.
+    index — результат build_tf_index, чтобы не пересобирать его для каждого кода.
+    """
+    if index is None:
+        index = build_tf_index(full_text, window)
+
+    if tf_code in index:
+        start, end = index[tf_code]
+        return full_text[start:end]
+
+    # Код, полученный от модели, мог быть записан в тексте иначе.
+    lines = text_lines(full_text)
 
     letter, nums = tf_code.split("/")
     num1, num2 = nums.split(".")
 
-    flex_pattern = rf"{letter}\s*[/\-–—]?\s*{num1}\s*[\.\-–—,·]?\s*{num2}"
+    flex_pattern = re.compile(rf"{re.escape(letter)}\s*[/\-–—]?\s*{num1}\s*[\.\-–—,·]?\s*{num2}")
 
-    indices = [i for i, line in enumerate(lines) if re.search(flex_pattern, line)]
+    indices = [i for i, line in enumerate(lines) if flex_pattern.search(line)]
 
     if not indices:
         return ""
@@ -110,7 +196,17 @@ def get_context_for_tf(full_text, tf_code, window=25):
     end = min(len(lines), i + window)
     return "\n".join(lines[start:end])
 
-def analyze_single_tf_with_ai(tf_code, context_text):
+def empty_tf_record(tf_code):
+    return {
+        "code": tf_code,
+        "name": "",
+        "actions": [],
+        "knowledge": [],
+        "skills": [],
+        "other": []
+    }
+
+def analyze_single_tf_with_ai(tf_code, context_text, refresh=False):
     prompt = f"""
 Ты — эксперт по профессиональным стандартам РФ.
 
@@ -130,7 +226,11 @@ def analyze_single_tf_with_ai(tf_code, context_text):
     raw = call_yandex_lite(
         [{"role": "user", "text": prompt + context_text[:6000]}],
         max_tokens=1200,
-        temperature=0.2
+        temperature=0.2,
+        caller="analyze_single_tf_with_ai",
+        # Ответ без названия и действий не кэшируется: повторный анализ спросит заново.
+        validate=lambda text: _tf_record_from(tf_code, extract_json(text)) is not None,
+        refresh=refresh
     )
 
     try:
@@ -138,14 +238,7 @@ def analyze_single_tf_with_ai(tf_code, context_text):
         end = raw.rindex("}") + 1
         data = json.loads(raw[start:end])
     except:
-        return {
-            "code": tf_code,
-            "name": "",
-            "actions": [],
-            "knowledge": [],
-            "skills": [],
-            "other": []
-        }
+        return empty_tf_record(tf_code)
 
     return {
         "code": tf_code,
@@ -156,28 +249,347 @@ def analyze_single_tf_with_ai(tf_code, context_text):
         "other": data.get("other") or []
     }
 
-def analyze_prof_standard(full_text):
+TF_SECTIONS = {
+    "трудовые действия": "actions",
+    "необходимые умения": "skills",
+    "необходимые знания": "knowledge",
+    "другие характеристики": "other",
+}
+
+TF_SECTION_RE = re.compile(
+    r"^\s*(Трудовые\s+действия|Необходимые\s+умения|Необходимые\s+знания|Другие\s+характеристики)\b\s*(.*)$",
+    re.IGNORECASE
+)
+
+TF_SECTION_START_RE = re.compile(
+    r"^[ \t]*(?:Трудовые\s+действия|Необходимые\s+умения|Необходимые\s+знания|Другие\s+характеристики)",
+    re.IGNORECASE | re.MULTILINE
+)
+
+TF_NAME_RE = re.compile(r"Наименование\s+(.+?)\s+Код\b", re.DOTALL)
+
+_EMPTY_ITEM_RE = re.compile(r"^[\s\-–—.,;:]*$|^\d{1,4}$")
+
+
+def _append_item(items, line):
+    """
+    Добавляет строку таблицы к списку пунктов. Пункт, перенесённый
+    на следующую строку (она начинается со строчной буквы или знака
+    препинания, либо предыдущая оборвана переносом), склеивается.
+    """
+    if items and items[-1].endswith("-") and line[:1].islower():
+        items[-1] = items[-1][:-1] + line
+    elif items and (line[:1].islower() or line[:1] in ",;:()»" or items[-1].endswith((",", "(", "«"))):
+        items[-1] = f"{items[-1]} {line}"
+    else:
+        items.append(line)
+
+
+def parse_tf_block(tf_code, block_text):
+    """
+    Разбор блока трудовой функции по типовой разметке профстандарта:
+    «Наименование ... Код», затем разделы «Трудовые действия»,
+    «Необходимые умения», «Необходимые знания», «Другие характеристики».
+
+    Возвращает запись ТФ или None, если блок не похож на типовой —
+    тогда он анализируется моделью.
+    """
+    block_text = block_text or ""
+
+    first_section = TF_SECTION_START_RE.search(block_text)
+    if first_section is None:
+        return None
+
+    head = block_text[:first_section.start()]
+
+    # Блок должен описывать именно эту ТФ, а не соседнюю из окна контекста.
+    if list(scan_tf_codes(head))[:1] != [tf_code]:
+        return None
+
+    name_match = TF_NAME_RE.search(head)
+    if not name_match:
+        return None
+
+    record = empty_tf_record(tf_code)
+    record["name"] = " ".join(name_match.group(1).split())
+
+    section = None
+    for raw_line in block_text[first_section.start():].split("\n"):
+        line = " ".join(raw_line.split())
+
+        header = TF_SECTION_RE.match(line)
+        if header:
+            section = TF_SECTIONS[" ".join(header.group(1).lower().split())]
+            line = header.group(2).strip()
+
+        if section is None or _EMPTY_ITEM_RE.match(line):
+            continue
+
+        _append_item(record[section], line)
+
+    if not record["name"] or not record["actions"] or not (record["skills"] or record["knowledge"]):
+        return None
+
+    return record
+
+
+def _estimate_tokens(text):
+    # Грубая оценка для русского текста: около трёх символов на токен.
+    return len(text) // 3 + 1
+
+
+def pack_tf_batches(contexts, token_budget=TF_BATCH_TOKENS, max_codes=TF_BATCH_MAX_CODES):
+    """
+    Жадно раскладывает пары (код, контекст) по пачкам в исходном порядке:
+    пачка закрывается, когда следующий блок превысил бы бюджет токенов
+    или в ней уже max_codes кодов.
+    """
+    batches = []
+    batch, used = [], 0
+
+    for code, context in contexts:
+        cost = _estimate_tokens(context[:TF_CONTEXT_MAX_CHARS]) + 20
+        if batch and (used + cost > token_budget or len(batch) >= max_codes):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((code, context))
+        used += cost
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _tf_record_from(tf_code, data):
+    """
+    Запись ТФ из ответа модели или None, если ответ для кода некорректен.
+    """
+    if not isinstance(data, dict):
+        return None
+
+    record = empty_tf_record(tf_code)
+    name = data.get("name") or ""
+    if not isinstance(name, str):
+        return None
+    record["name"] = name
+
+    for field in ("actions", "knowledge", "skills", "other"):
+        value = data.get(field) or []
+        if not isinstance(value, list):
+            return None
+        record[field] = value
+
+    if not record["name"] and not record["actions"]:
+        return None
+
+    return record
+
+
+def analyze_tf_batch_with_ai(batch, refresh=False):
+    """
+    Анализирует несколько трудовых функций одним запросом.
+    batch — список пар (код, контекст). Возвращает {код: запись} только
+    для кодов с корректным ответом; остальные анализируются поштучно.
+    """
+    codes = [code for code, _ in batch]
+    blocks = "\n\n".join(
+        f"=== {code} ===\n{context[:TF_CONTEXT_MAX_CHARS]}" for code, context in batch
+    )
+
+    prompt = f"""
+Ты — эксперт по профессиональным стандартам РФ.
+
+На входе — фрагменты текста профессионального стандарта, по одному
+на каждую трудовую функцию. Фрагмент начинается строкой «=== код ===».
+
+Коды:
+{chr(10).join(codes)}
+
+Извлеки по каждому коду из списка, строго по его фрагменту:
+- name
+- actions
+- knowledge
+- skills
+- other
+
+Верни строго JSON, ключ — код трудовой функции:
+{{
+  "{codes[0]}": {{"name": "", "actions": [], "knowledge": [], "skills": [], "other": []}}
+}}
+
+Фрагменты:
+{blocks}
+"""
+
+    raw = call_yandex_lite(
+        [{"role": "user", "text": prompt}],
+        max_tokens=min(7000, 300 + 800 * len(codes)),
+        temperature=0.2,
+        caller="analyze_tf_batch_with_ai",
+        validate=is_json_answer,
+        refresh=refresh
+    )
+
+    data = extract_json(raw)
+
+    result = {}
+    for code in codes:
+        record = _tf_record_from(code, data.get(code))
+        if record is not None:
+            result[code] = record
+
+    return result
+
+
+def _analyze_tf_contexts(contexts, workers, timeout, batch, progress_callback, refresh=False):
+    """
+    {код: запись} для пар (код, контекст). При batch=True сначала пачки,
+    затем поштучно — только коды, которых нет в ответах пачек.
+    """
+    analyzed = {}
+    done = 0
+
+    def report(codes):
+        nonlocal done
+        for code in codes:
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, len(contexts), code)
+
+    pending = contexts
+
+    if batch and len(contexts) > 1:
+        batches = pack_tf_batches(contexts)
+
+        def on_batch_done(i, result, error):
+            report([code for code, _ in batches[i] if result and code in result])
+
+        for result, error in run_bounded(
+            lambda items: analyze_tf_batch_with_ai(items, refresh),
+            batches,
+            limit=workers,
+            timeout=timeout,
+            on_done=on_batch_done
+        ):
+            if error is None and result:
+                analyzed.update(result)
+
+        pending = [(code, context) for code, context in contexts if code not in analyzed]
+
+    for (code, _), (result, error) in zip(pending, run_bounded(
+        lambda item: analyze_single_tf_with_ai(*item, refresh=refresh),
+        pending,
+        limit=workers,
+        timeout=timeout,
+        on_done=lambda i, result, error: report([pending[i][0]])
+    )):
+        analyzed[code] = result if error is None and result else empty_tf_record(code)
+
+    return analyzed
+
+
+def analyze_prof_standard(full_text, workers=TF_ANALYSIS_WORKERS, timeout=TF_ANALYSIS_TIMEOUT,
+                          progress_callback=None, batch=TF_BATCH_ENABLED,
+                          rule_parser=TF_RULE_PARSER_ENABLED, refresh=False):
     """
     Анализирует профстандарт и извлекает трудовые функции.
+
+    Блоки с типовой разметкой разбираются parse_tf_block без обращения
+    к модели (rule_parser=True); модель получает только остальные.
+
+    Трудовые функции анализируются параллельно (не более workers запросов),
+    порядок результатов совпадает с порядком кодов. ТФ, анализ которой
+    завершился ошибкой или не уложился в timeout секунд, получает пустую запись.
+    batch=True объединяет несколько ТФ в один запрос (см. pack_tf_batches).
+    progress_callback(done, total, code) вызывается после каждой ТФ.
+    refresh=True запрашивает модель заново, минуя кэш ответов (повторный анализ).
     """
     if not full_text or len(full_text.strip()) < 50:
         return None, "Текст профстандарта слишком короткий или пустой."
     
-    tf_codes = extract_tf_codes_smart(full_text)
+    # Смещения первых вхождений нужны и для списка кодов, и для индекса контекстов.
+    tf_offsets = scan_tf_codes(full_text)
+    tf_codes = list(tf_offsets) or extract_tf_codes_with_ai(full_text, refresh)
     if not tf_codes:
         # Пробуем еще раз с более широким поиском
         # Ищем любые упоминания "трудовая функция" или "ТФ"
-        if "трудовая функция" in full_text.lower() or "тф" in full_text.lower():
+        text_lower = lowered(full_text)
+        if "трудовая функция" in text_lower or "тф" in text_lower:
             return None, "Найдены упоминания трудовых функций, но не удалось извлечь коды. Возможно, используется нестандартный формат."
         return None, "Не найдено ни одного кода трудовых функций. Убедитесь, что файл содержит профессиональный стандарт с кодами ТФ (например, A/01.1, B/02.3)."
 
-    tf_list = []
-    for code in tf_codes:
-        context = get_context_for_tf(full_text, code)
-        tf_list.append(analyze_single_tf_with_ai(code, context))
+    tf_index = build_tf_index(full_text, offsets=tf_offsets)
+
+    contexts = [(code, get_context_for_tf(full_text, code, index=tf_index)) for code in tf_codes]
+
+    analyzed = {}
+    if rule_parser:
+        for code, context in contexts:
+            record = parse_tf_block(code, context)
+            if record is not None:
+                analyzed[code] = record
+                if progress_callback is not None:
+                    progress_callback(len(analyzed), len(contexts), code)
+
+    pending = [(code, context) for code, context in contexts if code not in analyzed]
+    parsed_count = len(analyzed)
+
+    def pending_progress(done, total, code):
+        if progress_callback is not None:
+            progress_callback(parsed_count + done, len(contexts), code)
+
+    analyzed.update(_analyze_tf_contexts(pending, workers, timeout, batch, pending_progress, refresh))
+
+    tf_list = [analyzed[code] for code, _ in contexts]
 
     return {"TF": tf_list}, None
 
+def incomplete_tf_codes(tf_struct):
+    """
+    Коды ТФ без результата анализа (пустая запись после ошибки или
+    таймаута). Такой разбор не стоит сохранять в библиотеку.
+    """
+    return [
+        tf.get("code", "")
+        for tf in (tf_struct or {}).get("TF", [])
+        if not tf.get("name") and not tf.get("actions")
+    ]
+
+
+PROF_REG_NUMBER_RE = re.compile(
+    r"Регистрационный\s+номер\s*[:№N]?\s*(\d{1,5})\b|\b(\d{1,5})\s*\n\s*Регистрационный\s+номер",
+    re.IGNORECASE
+)
+
+
+def detect_registration_number(full_text):
+    """
+    Регистрационный номер профстандарта из шапки документа. В таблице
+    шапки число может стоять как после подписи, так и перед ней.
+    """
+    match = PROF_REG_NUMBER_RE.search((full_text or "")[:5000])
+    if not match:
+        return ""
+    return match.group(1) or match.group(2)
+
+
+def detect_prof_title(full_text):
+    """
+    Название профстандарта — первая содержательная строка после
+    «ПРОФЕССИОНАЛЬНЫЙ СТАНДАРТ».
+    """
+    head = (full_text or "")[:5000]
+    position = lowered(head).find("профессиональный стандарт")
+    if position < 0:
+        return ""
+
+    for line in head[position + len("профессиональный стандарт"):].split("\n"):
+        line = " ".join(line.split()).strip(" .,;")
+        if len(line) > 3 and not line.isdigit():
+            return line[:200]
+    return ""
+
 def match_fgos_and_prof(df_fgos, tf_struct):
     fgos_short = df_fgos.copy()
     fgos_short["description"] = fgos_short["description"].apply(lambda x: str(x)[:300])
@@ -230,7 +642,9 @@ def match_fgos_and_prof(df_fgos, tf_struct):
     raw = call_yandex_lite(
         [{"role": "user", "text": prompt_match}],
         temperature=0.25,
-        max_tokens=1800
+        max_tokens=1800,
+        caller="match_fgos_and_prof",
+        validate=is_json_answer
     )
 
     try:
@@ -8,7 +8,7 @@ from docx.enum.table import WD_TABLE_ALIGNMENT, WD_CELL_VERTICAL_ALIGNMENT
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Pt, Cm
 
-from ai import call_yandex_lite
+from ai import call_yandex_lite, is_json_answer
 
 
 def _safe_str(value: Any) -> str:
@@ -310,6 +310,8 @@ def generate_work_program_content(
         [{"role": "user", "text": prompt}],
         temperature=0.2,
         max_tokens=3500,
+        caller="generate_work_program_content",
+        validate=is_json_answer,
     )
 
     data = _safe_json_from_text(raw)